@@ -0,0 +1,82 @@
+"""
+Helpers for running many API requests concurrently with asyncio.
+
+Requests are started in order, at most `max_concurrency` at a time, and
+optionally paced by a token-bucket rate limiter so that bursts stay within
+the provider's rate limits. Results are returned in submission order.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional
+
+
+class TokenBucket:
+    """Token-bucket rate limiter for asyncio tasks.
+
+    The bucket holds up to `capacity` tokens and refills at `rate` tokens per
+    second. Each request takes one token, waiting for a refill when the bucket
+    is empty.
+
+    Attributes
+    ----------
+    rate : float
+        Refill rate in tokens (requests) per second
+    capacity : float
+        Maximum number of tokens, i.e. the largest allowed burst
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def gather_ordered(
+        factories: List[Callable[[], Awaitable]],
+        max_concurrency: int = 8,
+        rate_limiter: Optional[TokenBucket] = None
+) -> list:
+    """Run coroutine factories concurrently and return their results in order.
+
+    Parameters
+    ----------
+    factories : List[Callable[[], Awaitable]]
+        Zero-argument callables, each returning the coroutine for one request
+    max_concurrency : int, optional
+        Maximum number of requests in flight at once, by default 8
+    rate_limiter : Optional[TokenBucket], optional
+        If provided, every request takes a token before it starts
+
+    Returns
+    -------
+    list
+        One result per factory, in the same order as `factories`
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(factory):
+        async with semaphore:
+            if rate_limiter is not None:
+                await rate_limiter.acquire()
+            return await factory()
+
+    return await asyncio.gather(*(run(factory) for factory in factories))
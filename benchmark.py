@@ -0,0 +1,684 @@
+"""
+One benchmark runner for every structured-output backend.
+
+A backend turns a case from `cases.py` into a validated Pydantic object. The
+runner times each call and writes one row per (backend, case) with the same
+columns for every backend, so plain prompting, Instructor and Outlines can be
+compared directly:
+
+    backend, model, test_id, schema, tag, repetition, valid,
+    latency_seconds, completion_tokens, retries, error
+
+Rows are appended to `benchmark_results.jsonl` as they finish. At the end a
+report is written to `benchmark_report.json` holding the rows as a columnar
+table (one list per column) and a per-backend summary with validity, latency
+percentiles, tokens/sec and retries.
+
+    python benchmark.py prompt instructor outlines
+    CASE_SCHEMAS=Car,Person python benchmark.py outlines
+    python benchmark.py --ab
+
+A single pass is noisy: the first Outlines call for a schema also pays FSM
+compilation and the first forward pass. For stable numbers, run each case
+`--warmup` times untimed and then `--repeat` times. Per case, the `--trim`
+fraction of fastest and slowest repetitions is dropped before the latency
+percentiles (p50/p95/p99) are computed, and each percentile gets a bootstrap
+confidence interval.
+
+    python benchmark.py outlines --warmup 1 --repeat 10 --trim 0.1
+    python benchmark.py outlines --repeat 10 --baseline baseline_report.json
+
+`--baseline` compares the summary with an earlier report and exits with
+status 1 when a backend regresses by more than `--max-regression`: its
+latency CI lies entirely above the baseline latency by that fraction, or its
+tokens/sec or validity rate drops by that fraction.
+
+`--ab` measures the cost of constraints: every case runs through `outlines`
+(`generate.json`) and `outlines-text` (`generate.text` on the same loaded
+model, validated afterwards), both limited to `--max-tokens` (AB_MAX_TOKENS
+by default), and the report compares tokens/sec, tokens emitted and validity
+per schema.
+
+Backends are looked up in `BACKENDS`; any other `module:Class` is imported as a
+plugin. A plugin subclasses `Backend` and implements `run`. Each backend
+imports its own dependencies in `setup`, so running one backend never loads
+another backend's client or model.
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from copy import copy
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from cases import Case, cases_from_env
+from results_sink import JsonlResultsSink, write_json
+from stats import percentile
+
+RESULTS_LOG = "benchmark_results.jsonl"
+REPORT_FILE = "benchmark_report.json"
+
+COLUMNS = [
+    "backend", "model", "test_id", "schema", "tag", "repetition", "valid",
+    "latency_seconds", "completion_tokens", "retries", "error"
+]
+
+# Latency percentiles reported, bootstrap resamples and confidence level of their intervals
+LATENCY_PERCENTILES = (50, 95, 99)
+BOOTSTRAP_SAMPLES = int(os.getenv("BOOTSTRAP_SAMPLES", "1000"))
+CONFIDENCE = 0.95
+
+# Summary metrics checked against a baseline, and whether higher values are better
+REGRESSION_METRICS = {
+    "latency_p50": False,
+    "latency_p95": False,
+    "tokens_per_second": True,
+    "validity_rate": True,
+}
+
+SYSTEM_PROMPT = "You must return JSON matching the expected schema."
+
+
+class Backend:
+    """Base class for benchmark backends.
+
+    Attributes
+    ----------
+    name : str
+        Name used in the results table
+    model_id : str
+        Model the backend generates with
+    """
+
+    name = "backend"
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+
+    def setup(self):
+        """Import dependencies and load clients or models. Called once before the first case."""
+
+    def prepare(self, cases: List[Case]):
+        """Build what the cases need before any of them is timed, e.g. compiled generators.
+
+        Called once after `setup`, so one-off costs are not charged to the
+        first case that needs them.
+        """
+
+    def run(self, case: Case) -> Dict[str, Any]:
+        """Generate and validate the output for one case.
+
+        Raise, or return an `error`, on invalid output. The runner measures
+        latency around this call.
+
+        Parameters
+        ----------
+        case : Case
+            The case to run
+
+        Returns
+        -------
+        Dict[str, Any]
+            Contains:
+            - output: The validated object as a dict
+            - completion_tokens: Tokens generated, or None if unknown
+            - retries: Completions issued beyond the first one
+            - error: Optional exception, if the output is invalid
+        """
+        raise NotImplementedError
+
+
+class PromptBackend(Backend):
+    """Plain prompting through Groq, validated with Pydantic afterwards."""
+
+    name = "prompt"
+
+    def __init__(self, model_id: str = "llama3-70b-8192"):
+        super().__init__(model_id)
+        self.client = None
+
+    def setup(self):
+        from groq import Groq
+
+        self.client = Groq(api_key=os.getenv("KEY"))
+
+    def run(self, case: Case) -> Dict[str, Any]:
+        completion = self.client.chat.completions.create(
+            model=self.model_id,
+            messages=[
+                {"role": "system", "content": ""},
+                {"role": "user", "content": case.prompt},
+            ]
+        )
+        raw = completion.choices[0].message.content.strip()
+        usage = getattr(completion, "usage", None)
+
+        return {
+            "output": case.schema.model_validate_json(raw).model_dump(),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "retries": 0
+        }
+
+
+class InstructorBackend(Backend):
+    """Instructor over an OpenAI-compatible API, with the budgeted retry scheduler."""
+
+    name = "instructor"
+
+    def __init__(self, model_id: str = "llama3-8b-8192", max_retries: int = 3):
+        super().__init__(model_id)
+        self.max_retries = max_retries
+        self.client = None
+        self.scheduler = None
+        self.completion_tokens = 0
+
+    def setup(self):
+        import instructor
+        from openai import OpenAI
+
+        from retry_scheduler import RetryScheduler
+
+        openai_client = OpenAI(base_url=os.getenv("INSTRUCTOR_BASE_URL", "https://api.groq.com/openai/v1"),
+                               api_key=os.getenv("KEY"),
+                               max_retries=0)
+        self.client = instructor.from_openai(openai_client)
+        self.scheduler = RetryScheduler(retry_budget=int(os.getenv("RETRY_BUDGET", "100")))
+        self.client.on("completion:kwargs", self.scheduler.on_completion_kwargs)
+        self.client.on("completion:response", self.scheduler.on_completion_response)
+        self.client.on("completion:response", self._count_tokens)
+
+    def _count_tokens(self, response):
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "completion_tokens", None):
+            self.completion_tokens += usage.completion_tokens
+
+    def run(self, case: Case) -> Dict[str, Any]:
+        from retry_scheduler import instructor_max_retries
+
+        tokens_before = self.completion_tokens
+        outcome = self.scheduler.run(
+            lambda attempts: self.client.chat.completions.create(
+                model=self.model_id,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": case.prompt},
+                ],
+                response_model=case.schema,
+                max_retries=instructor_max_retries(attempts)
+            ),
+            max_retries=self.max_retries
+        )
+        event = outcome["result"]
+
+        return {
+            "output": event.model_dump() if event else None,
+            "completion_tokens": self.completion_tokens - tokens_before,
+            "retries": outcome["retries"],
+            "error": outcome["error"]
+        }
+
+
+@lru_cache(maxsize=None)
+def load_outlines_model(model_id: str) -> Tuple[Any, Any]:
+    """Load a Transformers model wrapped for Outlines, and its tokenizer, once per model id.
+
+    Outlines backends share it, so an A/B run compares them on the same weights.
+    """
+    from outlines.models import Transformers
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    hf_model = AutoModelForCausalLM.from_pretrained(model_id)
+    return Transformers(hf_model, tokenizer), tokenizer
+
+
+class OutlinesBackend(Backend):
+    """Constrained generation with Outlines and a local Transformers model."""
+
+    name = "outlines"
+
+    def __init__(self, model_id: str = "HuggingFaceTB/SmolLM2-135M-Instruct", max_tokens: Optional[int] = None):
+        super().__init__(model_id)
+        self.max_tokens = max_tokens
+        self.tokenizer = None
+        self.generator_cache = None
+
+    def setup(self):
+        from generator_cache import GeneratorCache
+
+        outlines_model, self.tokenizer = load_outlines_model(self.model_id)
+        self.generator_cache = GeneratorCache(outlines_model, cache_dir=os.getenv("GENERATOR_CACHE_DIR"))
+
+    def prepare(self, cases: List[Case]):
+        """Compile the generator of every schema, so FSM compilation stays out of the timings."""
+        start_time = time.perf_counter()
+        for schema in dict.fromkeys(case.schema for case in cases):
+            self._generator(schema)
+        print(f"[{self.name}] Compiled {self.generator_cache.misses} generators "
+              f"in {time.perf_counter() - start_time:.2f}s")
+
+    def _generator(self, schema):
+        from outlines.samplers import greedy
+
+        return self.generator_cache.get(schema, sampler=greedy(), whitespace_pattern=r'[\n ]')
+
+    def run(self, case: Case) -> Dict[str, Any]:
+        generator = self._generator(case.schema)
+        # Keep the raw text so the generated tokens can be counted
+        raw_generator = copy(generator)
+        raw_generator.format_sequence = lambda x: x
+        raw = raw_generator(case.prompt, max_tokens=self.max_tokens)
+
+        return self._result(raw, generator.format_sequence)
+
+    def _result(self, raw: str, parse) -> Dict[str, Any]:
+        """Count the generated tokens and validate the text, keeping the count when it is invalid."""
+        result = {
+            "output": None,
+            "completion_tokens": len(self.tokenizer(raw, add_special_tokens=False)["input_ids"]),
+            "retries": 0,
+            "error": None
+        }
+        try:
+            result["output"] = parse(raw).model_dump()
+        except Exception as e:
+            result["error"] = e
+
+        return result
+
+
+class OutlinesTextBackend(OutlinesBackend):
+    """Unconstrained `generate.text` on the Outlines model, validated with Pydantic afterwards.
+
+    The baseline for the constraint overhead: same model, prompts and greedy
+    sampler as `outlines`, without the FSM. Generation stops at EOS or after
+    max_tokens.
+    """
+
+    name = "outlines-text"
+
+    def __init__(self, model_id: str = "HuggingFaceTB/SmolLM2-135M-Instruct", max_tokens: Optional[int] = 512):
+        super().__init__(model_id, max_tokens=max_tokens)
+        self.generator = None
+
+    def setup(self):
+        from outlines import generate
+        from outlines.samplers import greedy
+
+        outlines_model, self.tokenizer = load_outlines_model(self.model_id)
+        self.generator = generate.text(outlines_model, sampler=greedy())
+
+    def prepare(self, cases: List[Case]):
+        """Nothing to compile for unconstrained generation."""
+
+    def run(self, case: Case) -> Dict[str, Any]:
+        raw = self.generator(case.prompt, max_tokens=self.max_tokens)
+
+        return self._result(raw, lambda text: case.schema.model_validate_json(text.strip()))
+
+
+BACKENDS = {
+    PromptBackend.name: PromptBackend,
+    InstructorBackend.name: InstructorBackend,
+    OutlinesBackend.name: OutlinesBackend,
+    OutlinesTextBackend.name: OutlinesTextBackend,
+}
+
+# Backends compared by --ab: constrained first, then the unconstrained baseline.
+# Both get the same token limit, so neither arm generates longer than the other.
+AB_BACKENDS = (OutlinesBackend.name, OutlinesTextBackend.name)
+AB_MAX_TOKENS = 512
+
+
+def load_backend(spec: str) -> Backend:
+    """Create a backend from a name in BACKENDS or a `module:Class` plugin path."""
+    if spec in BACKENDS:
+        return BACKENDS[spec]()
+
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown backend '{spec}'. Use one of {sorted(BACKENDS)} or module:Class")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def bootstrap_ci(values: Sequence[float], q: float, samples: int = BOOTSTRAP_SAMPLES,
+                 confidence: float = CONFIDENCE, seed: int = 0) -> Optional[List[float]]:
+    """Percentile bootstrap confidence interval of the q-th percentile of `values`.
+
+    Resamples `values` with replacement `samples` times. Returns [low, high],
+    or None if there are fewer than two values or `samples` is 0.
+    """
+    if len(values) < 2 or not samples:
+        return None
+    rng = random.Random(seed)
+    estimates = [percentile(rng.choices(values, k=len(values)), q) for _ in range(samples)]
+    tail = (1 - confidence) / 2 * 100
+    return [percentile(estimates, tail), percentile(estimates, 100 - tail)]
+
+
+def trim_outliers(rows: List[Dict[str, Any]], trim: float = 0.0) -> List[Dict[str, Any]]:
+    """Drop the `trim` fraction of fastest and slowest repetitions of each case.
+
+    Trimming is per case, so slow cases are kept and only the outliers
+    among a case's own repetitions are dropped.
+    """
+    per_case = {}
+    for row in rows:
+        per_case.setdefault(row["test_id"], []).append(row)
+
+    kept = []
+    for case_rows in per_case.values():
+        case_rows = sorted(case_rows, key=lambda r: r["latency_seconds"])
+        cut = int(len(case_rows) * trim)
+        kept.extend(case_rows[cut:len(case_rows) - cut])
+
+    return kept
+
+
+def _run_case(backend: Backend, case: Case) -> Dict[str, Any]:
+    row = {
+        "backend": backend.name,
+        "model": backend.model_id,
+        "test_id": case.test_id,
+        "schema": case.schema.__name__,
+        "tag": case.tag,
+        "repetition": 0,
+        "valid": False,
+        "latency_seconds": None,
+        "completion_tokens": None,
+        "retries": 0,
+        "error": None
+    }
+
+    start_time = time.perf_counter()
+    try:
+        result = backend.run(case)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {str(e)}"
+    else:
+        error = result.get("error")
+        row["valid"] = error is None
+        row["completion_tokens"] = result.get("completion_tokens")
+        row["retries"] = result.get("retries", 0)
+        if error is not None:
+            row["error"] = f"{type(error).__name__}: {str(error)}"
+    row["latency_seconds"] = time.perf_counter() - start_time
+
+    return row
+
+
+def run_backend(backend: Backend, cases: List[Case], sink: JsonlResultsSink,
+                warmup: int = 0, repeat: int = 1) -> List[Dict[str, Any]]:
+    """Run every case through one backend and return one row per case and repetition.
+
+    Each case first runs `warmup` times without being recorded, so one-off
+    costs such as FSM compilation stay out of its timings.
+    """
+    backend.setup()
+    backend.prepare(cases)
+
+    rows = []
+    for case in cases:
+        print(f"[{backend.name}] Test {case.test_id}: {case.prompt[:50]}...")
+        for _ in range(warmup):
+            _run_case(backend, case)
+
+        for repetition in range(repeat):
+            row = _run_case(backend, case)
+            row["repetition"] = repetition
+            rows.append(row)
+            sink.append(row)
+
+    return rows
+
+
+def summarize(rows: List[Dict[str, Any]], by: Sequence[str] = ("backend",), trim: float = 0.0,
+              bootstrap: int = BOOTSTRAP_SAMPLES) -> Dict[str, Dict[str, Any]]:
+    """Validity, latency percentiles, throughput and retries per group of rows.
+
+    Rows are grouped by the `by` columns; keys join their values with " / ",
+    e.g. "outlines / Car" for by=("backend", "schema"). Latency percentiles
+    and tokens/sec are computed after trimming (see `trim_outliers`), each
+    percentile with a `_ci` bootstrap interval from `bootstrap` resamples
+    (0 to skip). Validity and retries count every run.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(" / ".join(str(row[column]) for column in by), []).append(row)
+
+    summary = {}
+    for name, backend_rows in groups.items():
+        kept = trim_outliers(backend_rows, trim)
+        latencies = [r["latency_seconds"] for r in kept]
+        timed = [r for r in kept if r["completion_tokens"]]
+        valid = sum(r["valid"] for r in backend_rows)
+
+        summary[name] = {
+            **{column: backend_rows[0][column] for column in by},
+            "model": backend_rows[0]["model"],
+            "cases": len({r["test_id"] for r in backend_rows}),
+            "runs": len(backend_rows),
+            "valid": valid,
+            "validity_rate": valid / len(backend_rows),
+            **{key: value for q in LATENCY_PERCENTILES for key, value in (
+                (f"latency_p{q}", percentile(latencies, q)),
+                (f"latency_p{q}_ci", bootstrap_ci(latencies, q, samples=bootstrap))
+            )},
+            "completion_tokens_total": sum(r["completion_tokens"] for r in timed),
+            "tokens_per_second": (sum(r["completion_tokens"] for r in timed) /
+                                  sum(r["latency_seconds"] for r in timed)) if timed else None,
+            "retries_total": sum(r["retries"] for r in backend_rows),
+            "retries_mean": sum(r["retries"] for r in backend_rows) / len(backend_rows)
+        }
+
+    return summary
+
+
+def compare_ab(rows: List[Dict[str, Any]], constrained: str = AB_BACKENDS[0],
+               unconstrained: str = AB_BACKENDS[1]) -> Dict[str, Dict[str, Any]]:
+    """Constrained vs unconstrained decoding per schema, from the rows of both backends.
+
+    `throughput_ratio` is constrained over unconstrained tokens/sec, so
+    values below 1 are the FSM's speed cost; `validity_gain` is what that
+    cost buys.
+    """
+    summary = summarize([r for r in rows if r["backend"] in (constrained, unconstrained)], by=("schema", "backend"),
+                        bootstrap=0)
+
+    comparison = {}
+    for schema in dict.fromkeys(r["schema"] for r in rows):
+        a = summary.get(f"{schema} / {constrained}")
+        b = summary.get(f"{schema} / {unconstrained}")
+        if a is None or b is None:
+            continue
+
+        comparison[schema] = {
+            "constrained_tokens_per_second": a["tokens_per_second"],
+            "unconstrained_tokens_per_second": b["tokens_per_second"],
+            "throughput_ratio": (a["tokens_per_second"] / b["tokens_per_second"]
+                                 if a["tokens_per_second"] and b["tokens_per_second"] else None),
+            "constrained_tokens": a["completion_tokens_total"],
+            "unconstrained_tokens": b["completion_tokens_total"],
+            "constrained_validity": a["validity_rate"],
+            "unconstrained_validity": b["validity_rate"],
+            "validity_gain": a["validity_rate"] - b["validity_rate"]
+        }
+
+    return comparison
+
+
+def load_summary(report_path: str) -> Dict[str, Dict[str, Any]]:
+    """The per-backend summary of a saved report, keyed by backend."""
+    with open(report_path) as f:
+        columns = json.load(f)["summary"]
+
+    rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    return {row["backend"]: row for row in rows}
+
+
+def find_regressions(summary: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     max_regression: float = 0.1) -> List[Dict[str, Any]]:
+    """Metrics in REGRESSION_METRICS that got worse than the baseline by more than `max_regression`.
+
+    Only backends in both summaries are compared. A latency only counts as
+    a regression when its whole confidence interval (or the value itself,
+    without one) is above the allowed limit, so noise alone does not fail
+    a run.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        One entry per regression: backend, metric, baseline, current, limit
+    """
+    regressions = []
+    for backend, stats in summary.items():
+        reference = baseline.get(backend)
+        if reference is None:
+            continue
+
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            expected, current = reference.get(metric), stats.get(metric)
+            if expected is None or current is None:
+                continue
+
+            if higher_is_better:
+                limit = expected * (1 - max_regression)
+                regressed = current < limit
+            else:
+                limit = expected * (1 + max_regression)
+                ci = stats.get(f"{metric}_ci")
+                regressed = (ci[0] if ci else current) > limit
+            if regressed:
+                regressions.append({"backend": backend, "metric": metric, "baseline": expected,
+                                    "current": current, "limit": limit})
+
+    return regressions
+
+
+def to_columns(rows: List[Dict[str, Any]], columns: List[str]) -> Dict[str, list]:
+    """Turn a list of row dicts into a dict of column lists."""
+    return {column: [row.get(column) for row in rows] for column in columns}
+
+
+def print_summary(summary: Dict[str, Dict[str, Any]]):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    def fmt_ci(ci):
+        return "-" if ci is None else f"{ci[0]:.3f}-{ci[1]:.3f}"
+
+    print(f"\n{'backend':<12} {'valid':>9} {'p50 s':>8} {'p50 CI':>13} {'p95 s':>8} {'p99 s':>8} "
+          f"{'tok/s':>8} {'retries':>8}")
+    for name, stats in summary.items():
+        print(f"{name:<12} {stats['validity_rate']:>9.2%} {fmt(stats['latency_p50'], '.3f'):>8} "
+              f"{fmt_ci(stats['latency_p50_ci']):>13} {fmt(stats['latency_p95'], '.3f'):>8} "
+              f"{fmt(stats['latency_p99'], '.3f'):>8} {fmt(stats['tokens_per_second'], '.1f'):>8} "
+              f"{stats['retries_mean']:>8.2f}")
+
+
+def print_ab(comparison: Dict[str, Dict[str, Any]]):
+    def fmt(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    print(f"\n{'schema':<20} {'json tok/s':>10} {'text tok/s':>10} {'ratio':>7} {'json tok':>9} {'text tok':>9} "
+          f"{'json valid':>10} {'text valid':>10}")
+    for schema, stats in comparison.items():
+        print(f"{schema:<20} {fmt(stats['constrained_tokens_per_second'], '.1f'):>10} "
+              f"{fmt(stats['unconstrained_tokens_per_second'], '.1f'):>10} {fmt(stats['throughput_ratio'], '.2f'):>7} "
+              f"{stats['constrained_tokens']:>9} {stats['unconstrained_tokens']:>9} "
+              f"{stats['constrained_validity']:>10.2%} {stats['unconstrained_validity']:>10.2%}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the shared cases through one or more structured-output backends.")
+    parser.add_argument("backends", nargs="*",
+                        help=f"Backends to run: {', '.join(BACKENDS)} or module:Class")
+    parser.add_argument("--ab", action="store_true",
+                        help=f"Compare constrained and unconstrained decoding ({' vs '.join(AB_BACKENDS)}) per schema")
+    parser.add_argument("--max-tokens", type=int,
+                        help=f"Token limit for the Outlines backends (with --ab, {AB_MAX_TOKENS} by default)")
+    parser.add_argument("--warmup", type=int, default=0, help="Untimed runs of each case before it is measured")
+    parser.add_argument("--repeat", type=int, default=1, help="Measured runs of each case")
+    parser.add_argument("--trim", type=float, default=0.0,
+                        help="Fraction of each case's fastest and slowest repetitions left out of latency percentiles")
+    parser.add_argument("--baseline", help="Earlier report to check for regressions; exits with status 1 on one")
+    parser.add_argument("--max-regression", type=float, default=0.1,
+                        help="Allowed relative regression against --baseline")
+    parser.add_argument("--results-log", default=RESULTS_LOG, help="JSONL file rows are appended to")
+    parser.add_argument("--report", default=REPORT_FILE, help="Columnar report written at the end")
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error("--repeat must be at least 1 and --warmup at least 0")
+    if not 0 <= args.trim < 0.5:
+        parser.error("--trim must be in [0, 0.5)")
+    if args.ab:
+        args.backends = list(dict.fromkeys(list(AB_BACKENDS) + args.backends))
+    if not args.backends:
+        parser.error("name at least one backend, or use --ab")
+
+    load_dotenv()
+
+    backends = [load_backend(spec) for spec in args.backends]
+    max_tokens = args.max_tokens
+    if max_tokens is None and args.ab:
+        max_tokens = AB_MAX_TOKENS
+    if max_tokens is not None:
+        for backend in backends:
+            if isinstance(backend, OutlinesBackend):
+                backend.max_tokens = max_tokens
+    cases = cases_from_env()
+    print(f"Running {len(cases)} cases through {', '.join(b.name for b in backends)} "
+          f"({args.warmup} warmup, {args.repeat} measured runs each)")
+
+    rows = []
+    with JsonlResultsSink(args.results_log) as sink:
+        for backend in backends:
+            rows.extend(run_backend(backend, cases, sink, warmup=args.warmup, repeat=args.repeat))
+
+    summary = summarize(rows, trim=args.trim)
+    print_summary(summary)
+
+    summary_rows = list(summary.values())
+    schema_rows = list(summarize(rows, by=("backend", "schema"), trim=args.trim).values())
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_cases": len(cases),
+            "backends": [b.name for b in backends],
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+            "trim": args.trim,
+            "max_tokens": max_tokens,
+            "bootstrap_samples": BOOTSTRAP_SAMPLES,
+            "confidence": CONFIDENCE
+        },
+        "summary": to_columns(summary_rows, list(summary_rows[0]) if summary_rows else []),
+        "schema_summary": to_columns(schema_rows, list(schema_rows[0]) if schema_rows else []),
+        "results": to_columns(rows, COLUMNS)
+    }
+    if args.ab:
+        report["ab"] = compare_ab(rows)
+        print_ab(report["ab"])
+    regressions = []
+    if args.baseline:
+        regressions = find_regressions(summary, load_summary(args.baseline), args.max_regression)
+        report["regressions"] = {"baseline": args.baseline, "max_regression": args.max_regression,
+                                 "found": regressions}
+    write_json(args.report, report, indent=4)
+    print(f"\nReport saved to {args.report} (rows: {args.results_log})")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['backend']} {regression['metric']}: {regression['current']:.4g} "
+              f"(baseline {regression['baseline']:.4g}, limit {regression['limit']:.4g})")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
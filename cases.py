@@ -0,0 +1,284 @@
+"""
+The shared benchmark cases: the schemas and prompts every demo runs.
+
+Each case pairs a prompt with the schema its output must match, and is tagged
+as a happy path (an ordinary request the schema can satisfy) or an edge case
+(a request for invalid types, missing or extra fields, odd characters, or a
+schema that does not fit the prompt).
+
+This module only depends on pydantic, so any backend can load the cases
+without importing the other backends' clients or models. The case list is
+built on first use.
+"""
+import os
+from functools import lru_cache
+from typing import Iterable, List, Literal, NamedTuple, Optional, Type
+
+from pydantic import BaseModel
+
+HAPPY = "happy"
+EDGE = "edge"
+
+
+##################### schemas ###################################
+
+class NameYear(BaseModel):
+    name: str
+    year: int
+
+
+class Car(BaseModel):
+    make: str
+    model: str
+    year: int
+
+
+class Person(BaseModel):
+    name: str
+    age: int
+    occupation: str
+
+
+class Fruit(BaseModel):
+    name: str
+    color: str
+    sweetness_level: int
+
+
+class SimpleAnimal(BaseModel):
+    species: str
+    habitat: str
+    diet: str
+
+
+class Country(BaseModel):
+    name: str
+    capital: str
+    population_millions: int
+
+
+class Book(BaseModel):
+    title: str
+    author: str
+    published_year: int
+
+
+class Movie(BaseModel):
+    title: str
+    director: str
+    release_year: int
+
+
+class City(BaseModel):
+    name: str
+    country: str
+    population: int
+
+
+class Product(BaseModel):
+    id: int
+    name: str
+    price_usd: float
+
+
+class Complicated(BaseModel):
+    a: Literal["cat", "dog", "animal"]
+    b: int
+    c: bool
+
+
+SCHEMAS = {
+    schema.__name__: schema
+    for schema in (NameYear, Car, Person, Fruit, SimpleAnimal, Country, Book, Movie, City, Product, Complicated)
+}
+
+
+class Case(NamedTuple):
+    test_id: int
+    prompt: str
+    schema: Type[BaseModel]
+    tag: str
+
+
+@lru_cache(maxsize=None)
+def all_cases() -> List[Case]:
+    """Return every case, numbered from 1 in a fixed order."""
+    prompts = [
+        ("Give me a JSON object with your name and the year you were created.", NameYear, HAPPY),
+        ("Create a JSON where the name contains special characters @#$ and year is negative", NameYear, EDGE),
+        ("Generate output with name as empty string and year as 3.14 (should be integer)", NameYear, EDGE),
+        ("Return data with extra field 'timestamp' that shouldn't be present", NameYear, EDGE),
+        ("Generate a JSON object containing your name, the year of your creation, and the organization that developed you.",
+         NameYear, HAPPY),
+        ("List your name, creation year, and the programming languages you're proficient in.", NameYear, HAPPY),
+        ("Describe a car with make, model, year, and engine type.", Car, HAPPY),
+        ("Provide details of a car including make, model, year, and fuel efficiency in km/l.", Car, HAPPY),
+        ("List a car's make, model, year, and whether it's electric or gasoline-powered.", Car, HAPPY),
+        ("Provide a car's make, model, year, and its safety rating out of 5", Car, HAPPY),
+        ("Create a JSON object for a person including name, age, occupation, and nationality.", Person, HAPPY),
+        ("List a person's name, age, occupation, and years of experience in their field.", Person, HAPPY),
+        ("Provide details of a person with name, age, occupation, and their highest educational qualification.",
+         Person, HAPPY),
+        ("Generate a JSON object for a person including name, age, occupation, and marital status.", Person, HAPPY),
+        ("Describe a person with name, age, occupation, and their primary language.", Person, HAPPY),
+        ("Provide a JSON object for a fruit including name, color, sweetness level, and average weight in grams.",
+         Fruit, HAPPY),
+        ("List a fruit's name, color, sweetness level, and its season of availability.", Fruit, HAPPY),
+        ("Generate details of a fruit with name, color, sweetness level, and vitamin C content in mg.", Fruit, HAPPY),
+        ("Describe a fruit including name, color, sweetness level, and whether it's tropical or temperate.",
+         Fruit, HAPPY),
+        ("Provide a fruit's name, color, sweetness level, and common culinary uses.", Fruit, HAPPY),
+        ("Create a JSON object for an animal including species, habitat, diet, and average lifespan in years.",
+         SimpleAnimal, HAPPY),
+        ("List an animal's species, habitat, diet, and its conservation status.", SimpleAnimal, HAPPY),
+        ("Provide details of an animal with species, habitat, diet, and typical group behavior (e.g., solitary, pack).",
+         SimpleAnimal, HAPPY),
+        ("Describe an animal including species, habitat, diet, and its primary predators.", SimpleAnimal, HAPPY),
+        ("Generate a JSON object for an animal with species, habitat, diet, and whether it's nocturnal or diurnal.",
+         SimpleAnimal, HAPPY),
+        ("Provide a JSON object for a country including name, capital, population in millions, and official language.",
+         Country, HAPPY),
+        ("List a country's name, capital, population in millions, and its currency.", Country, HAPPY),
+        ("Generate details of a country with name, capital, population in millions, and its form of government.",
+         Country, HAPPY),
+        ("Describe a country including name, capital, population in millions, and its primary export.", Country, HAPPY),
+        ("Provide a country's name, capital, population in millions, and its continent.", Country, HAPPY),
+        ("Create a JSON object for a book including title, author, published year, and genre.", Book, HAPPY),
+        ("List a book's title, author, published year, and number of pages.", Book, HAPPY),
+        ("Provide details of a book with title, author, published year, and its ISBN number.", Book, HAPPY),
+        ("Describe a book including title, author, published year, and its target audience", Book, HAPPY),
+        ("Generate a JSON object for a book with title, author, published year, and whether it's part of a series.",
+         Book, HAPPY),
+        ("Provide a JSON object for a movie including title, director, release year, and genre.", Movie, HAPPY),
+        ("List a movie's title, director, release year, and its main actor.", Movie, HAPPY),
+        ("Generate details of a movie with title, director, release year, and its duration in minutes.", Movie, HAPPY),
+        ("Describe a movie including title, director, release year, and its box office earnings in USD.", Movie, HAPPY),
+        ("Provide a movie's title, director, release year, and its IMDb rating.", Movie, HAPPY),
+        ("Create a JSON object for a city including name, country, population, and area in square kilometers.",
+         City, HAPPY),
+        ("List a city's name, country, population, and its founding year.", City, HAPPY),
+        ("Provide details of a city with name, country, population, and its primary language.", City, HAPPY),
+        ("Describe a city including name, country, population, and its major industries.", City, HAPPY),
+        ("Generate a JSON object for a city with name, country, population, and its average annual temperature in Celsius.",
+         City, HAPPY),
+        ("Provide a JSON object for a product including id, name, price in USD, and category.", Product, HAPPY),
+        ("List a product's id, name, price in USD, and its manufacturer.", NameYear, EDGE),
+        ("Generate details of a product with id, name, price in USD, and its stock availability.", NameYear, EDGE),
+        ("Describe a product including id, name, price in USD, and its warranty period in months.", NameYear, EDGE),
+        ("Provide a product's id, name, price in USD, and its average customer rating out of 5.", NameYear, EDGE),
+        ("Create a JSON object with your name, year of creation, and your primary function or role.", NameYear, HAPPY),
+        ("Provide your name, the year you were created, and the version number of your current iteration.",
+         NameYear, HAPPY),
+        ("Produce output where the name is 12345 (should be string) and year is 'two thousand'", NameYear, EDGE),
+        ("Create JSON with unicode name 𝔘𝔫𝔦𝔠𝔬𝔡𝔢 and year 0x10 (hexadecimal)", NameYear, EDGE),
+        ("Generate car data where make is 123 and model is True (should be strings)", Car, EDGE),
+        ("Return JSON where model contains newlines and tabs", Car, EDGE),
+        ("Produce car data with year 'twenty twenty three'", Car, EDGE),
+        ("Generate output where make is null and model is extremely long string", Car, EDGE),
+        ("Return a JSON object describing a car with make, model, and year.", Car, HAPPY),
+        ("Create person data with age 'thirty-five'", Person, EDGE),
+        ("Generate output where occupation is a list ['teacher', 'writer'] instead of string", Person, EDGE),
+        ("Return JSON with nested address object that shouldn't exist", Person, EDGE),
+        ("Output a JSON object listing the name, age, and occupation of a person.", Person, HAPPY),
+        ("Create a JSON object for a fruit with name, color, and sweetness level.", Fruit, HAPPY),
+        ("Generate fruit data where sweetness_level is 'very sweet' instead of integer", Fruit, EDGE),
+        ("Create JSON with color as RGB array [255,0,0] instead of string", Fruit, EDGE),
+        ("Return output with name in ALL CAPS and negative sweetness", Fruit, EDGE),
+        ("Produce fruit data with extra 'expiry_date' field", Fruit, EDGE),
+        ("Generate output where color is 7 (should be string)", Fruit, EDGE),
+        ("Create animal data where diet is a dictionary {main: 'plants', occasional: 'meat'}", SimpleAnimal, EDGE),
+        ("Generate output with habitat as integer 42 instead of string", SimpleAnimal, EDGE),
+        ("Return JSON where species contains XML tags <species>Wolf</species>", SimpleAnimal, EDGE),
+        ("Produce animal data with missing 'diet' field", SimpleAnimal, EDGE),
+        ("Generate output with all fields set to null", SimpleAnimal, EDGE),
+        ("Give me a JSON object for an animal with species, habitat, and diet.", SimpleAnimal, HAPPY),
+        ("Describe a country in JSON with name, capital, and population (in millions).", Country, HAPPY),
+        ("Output a JSON object for a book with title, author, and published year.", Book, HAPPY),
+        ("Describe a movie in JSON with title, director, and release year.", Movie, HAPPY),
+        ("Create movie data where release_year is in future (2100)", Movie, EDGE),
+        ("Generate output with director as list ['Director1', 'Director2']", Movie, EDGE),
+        ("Return JSON where title is Unicode 𝕋𝕙𝕖 𝕄𝕒𝕥𝕣𝕚𝕩", Movie, EDGE),
+        ("Produce movie data with release_year as string '2000'", Movie, EDGE),
+        ("Generate output with extra 'sequels' field", Movie, EDGE),
+        ("Give me a JSON object for a city with name, country, and population.", City, HAPPY),
+        ("Create city data where population is 'about one million'", City, EDGE),
+        ("Generate output with country as country code 'US' instead of full name", City, EDGE),
+        ("Produce city data with population as scientific notation 1e6", City, EDGE),
+        ("Generate output with missing 'country' field", City, EDGE),
+        ("Create product data where price_usd is '$19.99' with dollar sign", Product, EDGE),
+        ("Generate output with id as string '123' instead of integer", Product, EDGE),
+        ("Return JSON where name contains HTML <b>Premium</b>", Product, EDGE),
+        ("Produce product data with negative price", Product, EDGE),
+        ("Generate output with extra 'discount' field", Product, EDGE),
+        ("Describe a product with ID, name, and price in USD as JSON.", Product, HAPPY),
+        ("Create data where a is 'CAT' (uppercase not in Literal)", Complicated, EDGE),
+        ("Generate output where b is True instead of integer", Complicated, EDGE),
+        ("Return JSON where c is 'yes' instead of boolean", Complicated, EDGE),
+        ("Produce data with missing 'a' field", Complicated, EDGE),
+        ("Generate output where all values are null", Complicated, EDGE),
+        ("Give me a JSON object for values in a, b and c", Complicated, HAPPY)
+    ]
+
+    return [
+        Case(test_id, prompt, schema, tag)
+        for test_id, (prompt, schema, tag) in enumerate(prompts, start=1)
+    ]
+
+
+def select_cases(
+        schemas: Optional[Iterable[str]] = None,
+        tags: Optional[Iterable[str]] = None,
+        start: Optional[int] = None,
+        stop: Optional[int] = None
+) -> List[Case]:
+    """Filter the cases by schema name, tag and test id range.
+
+    Parameters
+    ----------
+    schemas : Optional[Iterable[str]], optional
+        Schema names to keep, e.g. ["Car", "Person"]. By default keeps all.
+    tags : Optional[Iterable[str]], optional
+        Tags to keep, HAPPY and/or EDGE. By default keeps all.
+    start : Optional[int], optional
+        Smallest test id to keep (inclusive)
+    stop : Optional[int], optional
+        Largest test id to keep (inclusive)
+
+    Returns
+    -------
+    List[Case]
+        The matching cases, in test id order
+    """
+    schemas = set(schemas) if schemas is not None else None
+    tags = set(tags) if tags is not None else None
+
+    return [
+        case for case in all_cases()
+        if (schemas is None or case.schema.__name__ in schemas)
+        and (tags is None or case.tag in tags)
+        and (start is None or case.test_id >= start)
+        and (stop is None or case.test_id <= stop)
+    ]
+
+
+def cases_from_env() -> List[Case]:
+    """Select cases using the CASE_SCHEMAS, CASE_TAGS and CASE_RANGE environment variables.
+
+    CASE_SCHEMAS and CASE_TAGS are comma-separated lists, e.g. "Car,Person" and
+    "edge". CASE_RANGE is an inclusive test id range such as "10-20". Unset
+    variables do not filter.
+    """
+    schemas = os.getenv("CASE_SCHEMAS")
+    tags = os.getenv("CASE_TAGS")
+    start = stop = None
+    if os.getenv("CASE_RANGE"):
+        start, _, stop = os.getenv("CASE_RANGE").partition("-")
+        start = int(start) if start else None
+        stop = int(stop) if stop else None
+
+    return select_cases(
+        schemas=schemas.split(",") if schemas else None,
+        tags=tags.split(",") if tags else None,
+        start=start,
+        stop=stop
+    )
@@ -0,0 +1,158 @@
+"""
+A content-addressed, on-disk cache for LLM completions.
+
+Entries are keyed by a SHA-256 hash of everything that determines a
+completion: model name, messages, response schema and sampling parameters.
+Each entry is one small JSON file, so the cache survives restarts and can be
+inspected or deleted by hand.
+
+Entries older than `ttl_seconds` are treated as misses, and once the cache
+grows past `max_bytes` the least recently used entries are removed.
+
+Set `NO_COMPLETION_CACHE=1` (or pass `enabled=False`) when measuring latency,
+so every request actually goes to the provider.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+
+def completion_key(model: str, messages: List[Dict[str, Any]], schema: Optional[Dict[str, Any]] = None,
+                   **params) -> str:
+    """Hash the inputs that determine a completion.
+
+    Parameters
+    ----------
+    model : str
+        Model name
+    messages : List[Dict[str, Any]]
+        Chat messages sent to the model
+    schema : Optional[Dict[str, Any]]
+        JSON schema of the expected response, if any
+    **params
+        Sampling parameters such as temperature or max_retries
+
+    Returns
+    -------
+    str
+        Hex digest identifying the request
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "schema": schema, "params": params},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """Disk cache mapping request hashes to JSON-serializable completions.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Directory holding one `<key>.json` file per entry
+    ttl_seconds : Optional[float]
+        Maximum age of an entry. If None, entries never expire.
+    max_bytes : int
+        Total size the cache is trimmed to after a write
+    enabled : bool
+        If False, `get` always misses and `set` does nothing
+    hits : int
+        Number of lookups served from the cache
+    misses : int
+        Number of lookups that were not
+    """
+
+    def __init__(
+            self,
+            cache_dir: str = ".completion_cache",
+            ttl_seconds: Optional[float] = 7 * 24 * 3600,
+            max_bytes: int = 256 * 1024 * 1024,
+            enabled: Optional[bool] = None
+    ):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled if enabled is not None else os.getenv("NO_COMPLETION_CACHE", "0") != "1"
+        self.hits = 0
+        self.misses = 0
+
+        if self.enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if self.ttl_seconds is not None and age > self.ttl_seconds:
+                os.remove(path)
+                self.misses += 1
+                return None
+
+            with open(path, encoding="utf-8") as f:
+                value = json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+
+        # Record the access time for LRU eviction without changing the entry's age
+        os.utime(path, (time.time(), os.path.getmtime(path)))
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        """Store a JSON-serializable value under `key`."""
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "value": value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self._evict()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, name))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, name in sorted(entries):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Delete every entry."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
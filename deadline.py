@@ -0,0 +1,152 @@
+"""
+Cooperative generation timeouts for Outlines.
+
+`with_deadline` wraps a generator's logits processor with a
+`DeadlineLogitsProcessor`, in the same way `profile_logits` does. The model
+calls the processor once per generated token, so the processor checks a
+monotonic clock at every step. Once the deadline has passed it masks every
+token but EOS: each sequence ends at the next step, and generation returns
+normally with the text produced so far.
+
+Unlike `signal.alarm`, this works on any thread, alongside thread pools and
+event loops, and deadlines can be fractions of a second. The deadline is
+only checked between steps, so a generation overruns it by at most one
+step (a forward pass and the mask).
+
+    generator = with_deadline(copy(generator), seconds=2.5)
+    generator.logits_processor.start()
+    text = generator(prompt)
+    if generator.logits_processor.forced_sequences[0]:
+        ...  # `text` is the partial output
+
+In a batch, `forced_sequences` tells the sequences that were cut off apart
+from those that had already finished before the deadline.
+"""
+import math
+import time
+from copy import copy
+from typing import TYPE_CHECKING, List, Optional
+
+import torch
+
+from outlines.processors.base_logits_processor import OutlinesLogitsProcessor, Array
+
+if TYPE_CHECKING:
+    from outlines.generate import Generator
+
+
+class DeadlineLogitsProcessor(OutlinesLogitsProcessor):
+    """Forces EOS on every sequence once a deadline has passed.
+
+    Attributes
+    ----------
+    processor : Optional[OutlinesLogitsProcessor]
+        The processor that applies structural constraints. It is applied
+        until the deadline and skipped after it.
+    seconds : float
+        Time allowed from `start()` (or from the first step, without it)
+    eos_token_id : int
+        Token forced at the deadline
+    pad_token_id : Optional[int]
+        Token finished sequences are padded with. Together with EOS, it tells
+        finished sequences apart from those cut off at the deadline.
+    """
+
+    def __init__(self, processor=None, seconds: float = 30.0, eos_token_id: Optional[int] = None,
+                 pad_token_id: Optional[int] = None):
+        tokenizer = getattr(processor, 'tokenizer', None)
+        if eos_token_id is None:
+            eos_token_id = getattr(tokenizer, 'eos_token_id', None)
+        if eos_token_id is None:
+            raise ValueError("eos_token_id is required when the processor has no tokenizer")
+
+        self.processor = processor
+        self.seconds = seconds
+        self.eos_token_id = eos_token_id
+        self.pad_token_id = pad_token_id if pad_token_id is not None else getattr(tokenizer, 'pad_token_id', None)
+        if tokenizer is not None:
+            self.tokenizer = tokenizer
+        # Mutated rather than reassigned, so it is shared with Outlines' copies
+        self._state = {"deadline": None, "expired": False, "forced": []}
+
+    def __copy__(self):
+        """Copy the wrapped processor too, so its guide state starts fresh.
+
+        Outlines copies the logits processor for every generation call. The
+        deadline stays shared with the copy.
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        if self.processor is not None:
+            clone.processor = copy(self.processor)
+        return clone
+
+    def start(self):
+        """Start the clock. Call this right before every generator call.
+
+        Without it, the clock starts at the first step of the first call, so
+        the prompt prefill does not count and later calls share its deadline.
+        """
+        self._state["deadline"] = time.monotonic() + self.seconds
+        self._state["expired"] = False
+        self._state["forced"] = []
+
+    @property
+    def expired(self) -> bool:
+        """Whether the deadline passed during generation since `start`."""
+        return self._state["expired"]
+
+    @property
+    def forced_sequences(self) -> List[bool]:
+        """For each sequence of the batch, whether it was still generating when EOS was forced.
+
+        Empty if the deadline did not pass.
+        """
+        return self._state["forced"]
+
+    def process_logits(self, input_ids: Array, logits: Array) -> Array:
+        """Apply the wrapped processor, or only allow EOS once the deadline has passed."""
+        if self._state["deadline"] is None:
+            self._state["deadline"] = time.monotonic() + self.seconds
+
+        if time.monotonic() >= self._state["deadline"]:
+            if not self._state["expired"]:
+                # Sequences that already ended are padded after their EOS
+                last = input_ids[:, -1]
+                finished = last == self.eos_token_id
+                if self.pad_token_id is not None:
+                    finished |= last == self.pad_token_id
+                self._state["forced"] = (~finished).tolist()
+            self._state["expired"] = True
+            forced = torch.full_like(logits, -math.inf)
+            forced[:, self.eos_token_id] = 0
+            return forced
+
+        return self.processor.process_logits(input_ids, logits) if self.processor is not None else logits
+
+
+def with_deadline(generator: "Generator", seconds: float, eos_token_id: Optional[int] = None) -> "Generator":
+    """Add a cooperative timeout to a generator.
+
+    Wraps the generator's logits processor, if it has one, in a
+    DeadlineLogitsProcessor. The generator is modified in place, so pass a
+    copy of a cached generator.
+
+    Parameters
+    ----------
+    generator : Generator
+        The generator to limit
+    seconds : float
+        Time allowed per call, from `start()`
+    eos_token_id : Optional[int]
+        Token to force at the deadline. Defaults to the processor's tokenizer EOS.
+
+    Returns
+    -------
+    Generator
+        The same generator, whose `logits_processor` reports `expired` and
+        `forced_sequences`
+    """
+    generator.logits_processor = DeadlineLogitsProcessor(generator.logits_processor, seconds=seconds,
+                                                         eos_token_id=eos_token_id)
+    return generator
@@ -0,0 +1,170 @@
+"""
+A cache for compiled Outlines JSON generators.
+
+Building a JSON generator turns the Pydantic schema into a regex and then
+compiles that regex into an FSM index over the whole tokenizer vocabulary.
+The index only depends on the schema, the whitespace pattern and the
+tokenizer, so a sweep that reuses the same schema many times only needs to
+compile it once.
+
+Generators are kept in memory with LRU eviction. Optionally, the compiled
+index is also pickled to disk so that a fresh process can skip compilation.
+"""
+import hashlib
+import json
+import os
+import pickle
+from collections import OrderedDict
+from typing import Optional
+
+from outlines import generate
+from outlines.generate.api import SequenceGeneratorAdapter
+from outlines.processors.structured import GuideLogitsProcessor
+from outlines.samplers import Sampler
+from outlines_core.fsm.json_schema import build_regex_from_schema
+
+
+def sampler_key(sampler: Sampler) -> tuple:
+    """Build a hashable key describing a sampler's configuration.
+
+    Samplers such as `greedy()` are created fresh on every call, so they are
+    compared by type and parameters instead of identity.
+    """
+    params = {
+        name: value for name, value in vars(sampler).items()
+        if name != "logits_processors"
+    }
+    return (type(sampler).__name__,) + tuple(sorted(params.items()))
+
+
+class GeneratorCache:
+    """LRU cache of Outlines JSON generators for a single model.
+
+    Entries are keyed by schema identity, sampler configuration and
+    whitespace pattern.
+
+    Attributes
+    ----------
+    model : outlines.models.Transformers
+        The Outlines model the generators are built for
+    maxsize : int
+        Maximum number of generators kept in memory
+    cache_dir : Optional[str]
+        Directory where compiled FSM indexes are stored. If None, nothing
+        is written to disk.
+    hits : int
+        Number of lookups served from memory or disk
+    misses : int
+        Number of lookups that required compiling the schema
+    """
+
+    def __init__(self, model, maxsize: int = 16, cache_dir: Optional[str] = None):
+        self.model = model
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._generators = OrderedDict()
+        self._tokenizer_digest = None
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, schema, sampler: Sampler, whitespace_pattern: Optional[str] = None) -> SequenceGeneratorAdapter:
+        """Return a JSON generator for `schema`, compiling it only if needed.
+
+        Parameters
+        ----------
+        schema : Type[BaseModel]
+            The Pydantic model the output must conform to
+        sampler : Sampler
+            The sampler used by the generator
+        whitespace_pattern : Optional[str]
+            Pattern for JSON syntactic whitespace, passed on to Outlines
+
+        Returns
+        -------
+        SequenceGeneratorAdapter
+            A generator that returns instances of `schema`
+        """
+        key = (schema, sampler_key(sampler), whitespace_pattern)
+
+        generator = self._generators.get(key)
+        if generator is not None:
+            self._generators.move_to_end(key)
+            self.hits += 1
+            return generator
+
+        generator = self._load(schema, sampler, whitespace_pattern)
+        if generator is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            generator = generate.json(
+                self.model,
+                schema,
+                sampler=sampler,
+                whitespace_pattern=whitespace_pattern
+            )
+            self._store(schema, whitespace_pattern, generator)
+
+        self._generators[key] = generator
+        if len(self._generators) > self.maxsize:
+            self._generators.popitem(last=False)
+
+        return generator
+
+    def clear(self):
+        """Drop all in-memory generators. The on-disk store is left untouched."""
+        self._generators.clear()
+
+    def _index_path(self, schema, whitespace_pattern: Optional[str]) -> str:
+        """Path of the on-disk index for a schema and whitespace pattern."""
+        if self._tokenizer_digest is None:
+            vocabulary = json.dumps(self.model.tokenizer.vocabulary, sort_keys=True)
+            self._tokenizer_digest = hashlib.sha256(vocabulary.encode("utf-8")).hexdigest()
+
+        regex_str = build_regex_from_schema(json.dumps(schema.model_json_schema()), whitespace_pattern)
+        digest = hashlib.sha256(
+            f"{self._tokenizer_digest}\0{regex_str}".encode("utf-8")
+        ).hexdigest()
+
+        return os.path.join(self.cache_dir, f"{schema.__name__}-{digest[:16]}.pkl")
+
+    def _load(self, schema, sampler: Sampler, whitespace_pattern: Optional[str]) -> Optional[SequenceGeneratorAdapter]:
+        """Rebuild a generator from a stored FSM index, if there is one."""
+        if self.cache_dir is None:
+            return None
+
+        path = self._index_path(schema, whitespace_pattern)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                guide = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable generator cache entry {path}: {str(e)}")
+            return None
+
+        logits_processor = GuideLogitsProcessor(tokenizer=self.model.tokenizer, guide=guide)
+        generator = SequenceGeneratorAdapter(self.model, logits_processor, sampler)
+        generator.format_sequence = lambda x: schema.parse_raw(x)
+
+        return generator
+
+    def _store(self, schema, whitespace_pattern: Optional[str], generator: SequenceGeneratorAdapter):
+        """Write the generator's compiled FSM index to disk."""
+        if self.cache_dir is None:
+            return
+
+        path = self._index_path(schema, whitespace_pattern)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(generator.logits_processor.guide, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Could not store generator cache entry {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
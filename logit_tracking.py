@@ -0,0 +1,1332 @@
+"""
+A simple logit processor that tracks probabilities for both structured and unstructured generation.
+
+For each token generated, we store:
+- The raw logits the model would assign naturally
+- The filtered logits after applying structural constraints
+- A mapping from vocabulary indices to token strings
+
+A trace can be saved to a directory of .npy files with
+`LogitTrackingProcessor.save` and memory-mapped back with
+`LogitTrackingProcessor.load`, to analyse it later without the model.
+"""
+import hashlib
+import json
+import os
+import weakref
+from copy import copy
+from typing import TYPE_CHECKING, Optional, Union, List, Literal, Dict, Any
+
+import numpy as np
+import torch
+from numpy.typing import NDArray
+
+from outlines.processors.base_logits_processor import OutlinesLogitsProcessor, Array
+
+if TYPE_CHECKING:
+    from outlines.generate import Generator
+
+# Try importing pandas, but don't fail if not available
+try:
+    import pandas as pd
+
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+    pd = Any  # For type hints when pandas is not available
+
+# Decoded vocabularies are stored here as JSON, keyed by a hash of the
+# tokenizer's vocabulary. Set VOCAB_CACHE_DIR to an empty string to keep them
+# in memory only.
+VOCAB_CACHE_DIR = os.getenv("VOCAB_CACHE_DIR", ".vocab_cache")
+
+# Saved traces: one .npy file per non-empty buffer, plus a JSON file with the
+# sizes, the vocabulary and the decoded text of every sequence
+TRACE_FILE = "trace.json"
+TRACE_FORMAT = 1
+TRACE_ARRAYS = ("unstructured", "structured", "chosen", "top_indices", "top_unstructured",
+                "top_structured", "log_normalizers", "allowed", "stats", "chosen_rank")
+
+# Per-step statistics recorded in stats_only mode, in column order
+STAT_COLUMNS = ("allowed_mass", "kl_divergence", "natural_entropy", "constrained_entropy")
+
+
+class RowBuffer:
+    """Preallocated tensor that rows are written into in place, on the device they come from.
+
+    Storage is allocated on the first write with the row's shape, dtype and
+    device. When it is full, capacity doubles with one on-device copy, so
+    appends never transfer data to the host. `to_numpy` copies the rows
+    appended since its last call to a host mirror in a single transfer.
+
+    Attributes
+    ----------
+    capacity : int
+        Number of rows that fit before the storage grows
+    data : Optional[torch.Tensor]
+        The storage, shape (capacity, *row_shape). None until the first write.
+    length : int
+        Number of rows written
+    generation : int
+        Incremented by `clear`, so derived caches know to start over
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.data = None
+        self.length = 0
+        self.generation = 0
+        self._host = None  # Host mirror of the rows, grown like `data`
+        self._host_length = 0
+
+    def append(self, row: torch.Tensor):
+        """Copy `row` into the next free slot without synchronizing with the device."""
+        if self.data is None and self.length:
+            raise ValueError("The buffer holds loaded rows and is read-only; clear() it first")
+        if self.data is not None and tuple(row.shape) != tuple(self.data.shape[1:]):
+            if self.length:
+                raise ValueError(f"Row shape {tuple(row.shape)} does not match the buffer's "
+                                 f"{tuple(self.data.shape[1:])}; clear() the buffer first")
+            self.data = None
+        if self.data is None:
+            self.data = torch.empty((self.capacity,) + tuple(row.shape), dtype=row.dtype, device=row.device)
+        elif self.length == self.capacity:
+            grown = torch.empty((self.capacity * 2,) + tuple(self.data.shape[1:]),
+                                dtype=self.data.dtype, device=self.data.device)
+            grown[:self.length].copy_(self.data)
+            self.data = grown
+            self.capacity *= 2
+
+        self.data[self.length].copy_(row.detach())
+        self.length += 1
+
+    def to_numpy(self) -> NDArray:
+        """All rows written so far as a host array of shape (length, *row_shape).
+
+        Only rows appended since the previous call are transferred. Returned
+        arrays are never modified afterwards.
+        """
+        if self.length == 0:
+            return np.empty((0,))
+
+        if self._host_length < self.length:
+            rows = self.data[self._host_length:self.length]
+            if rows.is_floating_point() and rows.dtype not in (torch.float32, torch.float64):
+                rows = rows.float()  # numpy has no bfloat16
+            rows = rows.cpu().numpy()
+
+            if self._host is None or len(self._host) < self.length:
+                grown = np.empty((self.capacity,) + rows.shape[1:], dtype=rows.dtype)
+                if self._host is not None:
+                    grown[:self._host_length] = self._host[:self._host_length]
+                self._host = grown
+            self._host[self._host_length:self.length] = rows
+            self._host_length = self.length
+
+        return self._host[:self.length]
+
+    def wrap(self, rows: NDArray):
+        """Hold existing host rows, e.g. a memory-mapped array, without copying them.
+
+        The buffer is read-only until it is cleared.
+        """
+        self.clear()
+        self.data = None
+        self.capacity = max(len(rows), 1)
+        self._host = rows
+        self.length = self._host_length = len(rows)
+
+    def clear(self):
+        """Forget all rows, keeping the allocated device storage for reuse."""
+        self.length = 0
+        self.generation += 1
+        # Arrays handed out by to_numpy are views of the mirror, so start a new one
+        self._host = None
+        self._host_length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class CachedSoftmax:
+    """Probabilities of a RowBuffer's logit rows, computed once per row.
+
+    The first call runs one vectorized log-softmax over all rows; later calls
+    only process rows appended since. Clearing the buffer resets the cache.
+    """
+
+    def __init__(self, buffer: RowBuffer):
+        self.buffer = buffer
+        self._probs = None
+        self._length = 0
+        self._generation = buffer.generation
+
+    def to_numpy(self) -> NDArray:
+        """Probabilities for all rows, shape (length, *row_shape)."""
+        if self._generation != self.buffer.generation:
+            self._probs, self._length, self._generation = None, 0, self.buffer.generation
+
+        length = len(self.buffer)
+        if length == 0:
+            return np.empty((0,))
+
+        if self._length < length:
+            new_logits = torch.from_numpy(self.buffer.to_numpy()[self._length:length])
+            new_probs = torch.log_softmax(new_logits, dim=-1).exp_().numpy()
+
+            if self._probs is None or len(self._probs) < length:
+                grown = np.empty((self.buffer.capacity,) + new_probs.shape[1:], dtype=new_probs.dtype)
+                if self._probs is not None:
+                    grown[:self._length] = self._probs[:self._length]
+                self._probs = grown
+            self._probs[self._length:length] = new_probs
+            self._length = length
+
+        return self._probs[:length]
+
+
+class SparseRows:
+    """Read-only sequence of dense rows rebuilt from top-k captures.
+
+    Row `pos` has the captured values at the captured indices and `fill`
+    everywhere else. With `log_normalizers`, values are turned into exact
+    probabilities, exp(logit - logsumexp(logits)).
+
+    Attributes
+    ----------
+    indices : NDArray
+        Captured token ids, shape (n_positions, k)
+    values : NDArray
+        Captured logits, shape (n_positions, k)
+    vocab_size : int
+        Length of each rebuilt row
+    fill : float
+        Value for tokens outside the capture
+    log_normalizers : Optional[NDArray]
+        Log-sum-exp of each full row, shape (n_positions,)
+    """
+
+    def __init__(self, indices: NDArray, values: NDArray, vocab_size: int, fill: float,
+                 log_normalizers: Optional[NDArray] = None):
+        self.indices = indices
+        self.values = values
+        self.vocab_size = vocab_size
+        self.fill = fill
+        self.log_normalizers = log_normalizers
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, pos: int) -> NDArray:
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError(pos)
+
+        values = self.values[pos]
+        if self.log_normalizers is not None:
+            values = np.exp(values - self.log_normalizers[pos])
+
+        row = np.full(self.vocab_size, self.fill, dtype=np.float32)
+        row[self.indices[pos]] = values
+        return row
+
+    def __iter__(self):
+        return (self[pos] for pos in range(len(self)))
+
+    def to_matrix(self) -> NDArray:
+        """All rows as one dense array, shape (n_positions, vocab_size)."""
+        return np.stack(list(self)) if len(self) else np.empty((0, self.vocab_size), dtype=np.float32)
+
+
+class DecodedTextIndex:
+    """Decoded text of a growing token sequence, with the text length after each token.
+
+    Tokens are decoded incrementally: each new token is decoded once, as part
+    of a window that starts a few tokens before it, and the text the window
+    already decoded to is sliced off to get the text it adds. While the
+    decoded window ends in an incomplete multi-byte character ("\ufffd"),
+    nothing is appended and the window grows until the character is complete,
+    so that text is attributed to the token that completes it. Decoding with
+    context also keeps the spacing of tokenizers whose tokens decode
+    differently at the start of a sequence, so `decode` must decode the ids
+    as one sequence rather than one by one.
+
+    Attributes
+    ----------
+    tokens : List[int]
+        Token ids indexed so far
+    text : str
+        Decoded text of `tokens`
+    offsets : List[int]
+        offsets[n] is the length of the text decoded from the first n tokens
+    """
+
+    def __init__(self, decode, context: int = 4):
+        """Create an empty index.
+
+        Parameters
+        ----------
+        decode : Callable[[List[int]], str]
+            Decodes a sequence of token ids to a string
+        context : int, optional
+            Tokens kept before the next token when the window moves forward
+        """
+        self.decode = decode
+        self.context = context
+        self.tokens = []
+        self.text = ""
+        self.offsets = [0]
+        self._prefix_offset = 0  # Start of the context window
+        self._prefix_text = ""  # Decoded window, up to the text already appended
+
+    def extend(self, tokens: List[int]):
+        """Index more tokens, decoding each one once with its context."""
+        for token in tokens:
+            self.tokens.append(token)
+            window_text = self.decode(self.tokens[self._prefix_offset:])
+
+            if len(window_text) > len(self._prefix_text) and not window_text.endswith("\ufffd"):
+                self.text += window_text[len(self._prefix_text):]
+                self._prefix_text = window_text
+                if len(self.tokens) - self._prefix_offset > 2 * self.context:
+                    # Move the window forward, so decoding stays linear in the sequence length
+                    self._prefix_offset = len(self.tokens) - self.context
+                    self._prefix_text = self.decode(self.tokens[self._prefix_offset:])
+
+            self.offsets.append(len(self.text))
+
+    def prefix(self, n: int) -> str:
+        """Text decoded from the first n tokens."""
+        return self.text[:self.offsets[n]]
+
+
+def pack_mask(mask: torch.Tensor) -> torch.Tensor:
+    """Pack a boolean tensor into bytes along its last dimension, on its device.
+
+    Bits are most significant first, as `np.unpackbits` expects.
+    """
+    padding = (-mask.shape[-1]) % 8
+    bits = torch.nn.functional.pad(mask.to(torch.uint8), (0, padding))
+    bits = bits.view(*mask.shape[:-1], -1, 8)
+    weights = torch.tensor([128, 64, 32, 16, 8, 4, 2, 1], dtype=torch.uint8, device=mask.device)
+    return (bits * weights).sum(dim=-1, dtype=torch.uint8)
+
+
+def top_k_indices(values: NDArray, k: int) -> NDArray:
+    """Indices of the k largest values along the last axis, largest first.
+
+    `argpartition` finds the k entries in linear time and only those k are
+    sorted, instead of sorting the whole vocabulary. Leading dimensions are
+    kept, so all positions of a (n_positions, vocab_size) matrix are handled
+    in one call.
+    """
+    values = np.asarray(values)
+    k = max(0, min(k, values.shape[-1]))
+    if k == 0:
+        return np.empty(values.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < values.shape[-1]:
+        indices = np.argpartition(values, -k, axis=-1)[..., -k:]
+    else:
+        indices = np.broadcast_to(np.arange(k), values.shape[:-1] + (k,))
+    order = np.argsort(-np.take_along_axis(values, indices, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(indices, order, axis=-1)
+
+
+# Decoded vocabularies shared by every tracker, keyed by tokenizer digest and size
+_vocab_strings: Dict[str, List[str]] = {}
+# Digest per live tokenizer object: id -> (weak reference, digest)
+_tokenizer_digests: Dict[int, tuple] = {}
+
+
+def tokenizer_digest(tokenizer) -> str:
+    """Hash of a tokenizer's vocabulary and special tokens, computed once per tokenizer object.
+
+    Accepts an Outlines tokenizer (`vocabulary`, `special_tokens`) or a
+    Hugging Face tokenizer (`get_vocab()`, `all_special_tokens`).
+    """
+    entry = _tokenizer_digests.get(id(tokenizer))
+    if entry is not None and entry[0]() is tokenizer:
+        return entry[1]
+
+    vocabulary = getattr(tokenizer, "vocabulary", None)
+    if vocabulary is None:
+        vocabulary = tokenizer.get_vocab()
+    special_tokens = getattr(tokenizer, "special_tokens", None)
+    if special_tokens is None:
+        special_tokens = getattr(tokenizer, "all_special_tokens", [])
+
+    digest = hashlib.sha256(
+        json.dumps([vocabulary, sorted(special_tokens)], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+    try:
+        _tokenizer_digests[id(tokenizer)] = (weakref.ref(tokenizer), digest)
+    except TypeError:
+        pass  # Not weak-referenceable, hash it again next time
+    return digest
+
+
+def _decode_vocab(tokenizer, vocab_size: int) -> List[str]:
+    """Decode every id below vocab_size on its own, in one call where possible.
+
+    Matches Outlines' `tokenizer.decode([i])[0]`, which batch-decodes with
+    special tokens skipped. Ids past the tokenizer's vocabulary (padded
+    embedding rows) decode to empty strings.
+    """
+    hf_tokenizer = getattr(tokenizer, "tokenizer", tokenizer)
+    if hasattr(hf_tokenizer, "batch_decode"):
+        return hf_tokenizer.batch_decode([[i] for i in range(vocab_size)], skip_special_tokens=True)
+    return [tokenizer.decode([i])[0] for i in range(vocab_size)]
+
+
+def vocab_strings(tokenizer, vocab_size: int, cache_dir: Optional[str] = VOCAB_CACHE_DIR) -> List[str]:
+    """Decoded string of every token id below vocab_size.
+
+    The list is built once per tokenizer and shared by every caller in the
+    process, so treat it as read-only. With a cache_dir it is also stored on
+    disk and reused by later runs with the same tokenizer.
+
+    Parameters
+    ----------
+    tokenizer
+        Outlines or Hugging Face tokenizer
+    vocab_size : int
+        Number of ids to decode, usually the width of the logits
+    cache_dir : Optional[str]
+        Directory for the on-disk cache, or None/"" to skip it
+
+    Returns
+    -------
+    List[str]
+        Token strings, where index matches vocabulary index
+    """
+    key = f"{tokenizer_digest(tokenizer)[:16]}-{vocab_size}"
+    strings = _vocab_strings.get(key)
+    if strings is not None:
+        return strings
+
+    path = os.path.join(cache_dir, f"{key}.json") if cache_dir else None
+    if path is not None and os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                strings = json.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable vocabulary cache entry {path}: {str(e)}")
+
+    if strings is None or len(strings) != vocab_size:
+        strings = _decode_vocab(tokenizer, vocab_size)
+        if path is not None:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(strings, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Could not store vocabulary cache entry {path}: {str(e)}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    _vocab_strings[key] = strings
+    return strings
+
+
+class LogitTrackingProcessor(OutlinesLogitsProcessor):
+    """Tracks logits for both structured and unstructured token generation.
+
+    For each position in the sequence, stores:
+    - unstructured_logits: Raw logits from the model
+    - structured_logits: Logits after applying constraints
+    - vocab_tokens: Mapping from vocab indices to token strings
+
+    Each logit matrix has:
+    - Columns: One for each position in the generated sequence
+    - Rows: One for each token in the vocabulary
+
+    Every sequence in the batch is tracked. Storage is indexed by (position,
+    sequence, token); the analysis methods report the sequence selected by
+    `batch_index` (0 by default, see `for_sequence`), and `get_batch_logits`
+    returns every sequence at once.
+
+    Logits are written in place into preallocated buffers on the model's
+    device, so tracking does not synchronize with the device at each step.
+    They are copied to the host in one transfer when analysis is requested.
+    Outlines copies the processor for every generation call; the copies share
+    these buffers, so everything a generation records is visible here. Each
+    generation call starts a new trace, so the tracker always holds the most
+    recent generation, whatever its batch size.
+
+    With `top_k` set, only a sparse capture is kept per position: the k tokens
+    with the highest natural or constrained probability, their logits in both
+    distributions, the log-sum-exp of each distribution (so their
+    probabilities stay exact) and a bitmask of the tokens the constraint
+    allowed. Analysis methods rebuild full rows from it, with -inf logits and
+    zero probabilities outside the captured tokens. `get_top_tokens`,
+    `to_dataframe` and the plots are exact for up to `top_k` tokens.
+
+    With `stats_only` set, no logits are kept. Each step records a few
+    numbers per sequence, computed on the device (see `get_step_stats`): the
+    natural probability mass of the allowed tokens, the KL divergence from
+    the natural to the constrained distribution, the entropy of both and the
+    natural rank of the chosen token. Memory per step does not depend on the
+    vocabulary size. `get_top_tokens` and `get_batch_logits` need logits, so
+    they raise ValueError in this mode.
+
+    Attributes
+    ----------
+    processor : Optional[OutlinesLogitsProcessor]
+        The processor that applies structural constraints
+    batch_index : int
+        Sequence of the batch the analysis methods report on
+    unstructured_logits : List[NDArray]
+        Raw logits from the model for each position
+    structured_logits : List[NDArray]
+        Logits after applying constraints for each position
+    vocab_tokens : Optional[List[str]]
+        Mapping from vocabulary indices to token strings
+    chosen_tokens : List[int]
+        Track actual chosen token IDs during generation
+    """
+
+    def __init__(self, processor=None, max_positions: int = 256, top_k: Optional[int] = None,
+                 stats_only: bool = False):
+        """Initialize the tracking processor.
+
+        Parameters
+        ----------
+        processor : Optional[OutlinesLogitsProcessor]
+            The processor that applies structural constraints.
+            If None, only tracks raw logits.
+        max_positions : int, optional
+            Positions to preallocate storage for, by default 256.
+            Longer generations grow the buffers.
+        top_k : Optional[int], optional
+            If set, keep only a sparse top-k capture per position instead of
+            full vocabulary rows.
+        stats_only : bool, optional
+            If True, keep only per-step constraint statistics, by default False
+        """
+        if top_k is not None and stats_only:
+            raise ValueError("top_k and stats_only are separate capture modes; set only one")
+
+        self.processor = processor
+        self.top_k = top_k
+        self.stats_only = stats_only
+        self.batch_index = 0
+        # One (n_sequences, ...) row per position
+        self._unstructured = RowBuffer(max_positions)  # Raw logits
+        self._structured = RowBuffer(max_positions)  # Constrained logits
+        self._chosen = RowBuffer(max_positions)  # Chosen token ids, kept on the device
+        self._unstructured_probs = CachedSoftmax(self._unstructured)
+        self._structured_probs = CachedSoftmax(self._structured)
+        # Sparse capture (top_k mode): token ids, their logits in both
+        # distributions, both log-sum-exps and the packed allowed-token mask
+        self._top_indices = RowBuffer(max_positions)
+        self._top_unstructured = RowBuffer(max_positions)
+        self._top_structured = RowBuffer(max_positions)
+        self._log_normalizers = RowBuffer(max_positions)
+        self._allowed = RowBuffer(max_positions)
+        # Streaming statistics (stats_only mode): one STAT_COLUMNS row per
+        # sequence, and the chosen token's natural rank, known one step later
+        self._stats = RowBuffer(max_positions)
+        self._chosen_rank = RowBuffer(max_positions)
+        self._last_step = {"log_probs": None, "length": 0}  # Natural log-probs of the previous step
+        # Mutated rather than reassigned, so it is shared with Outlines' copies
+        self._meta = {"vocab_size": 0, "n_sequences": 0, "input_shape": None}
+        self._generating = False  # Set on the copy Outlines makes for a generation call
+        self._text_indexes = {}  # batch_index -> (chosen tokens generation, DecodedTextIndex)
+        self.vocab_tokens = None  # Will store the vocabulary mapping
+        self._token_categories = None  # (vocab, unique strings, code per id) for DataFrames
+
+    def __copy__(self):
+        """Copy the wrapped processor too, so its guide state starts fresh.
+
+        Outlines copies the logits processor for every generation call. The
+        trace stays shared with the copy.
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        if self.processor is not None:
+            clone.processor = copy(self.processor)
+        return clone
+
+    @property
+    def n_positions(self) -> int:
+        """Number of positions tracked."""
+        if self.stats_only:
+            return len(self._stats)
+        return len(self._structured) if self.top_k is None else len(self._log_normalizers)
+
+    @property
+    def vocab_size(self) -> int:
+        return self._meta["vocab_size"]
+
+    @property
+    def n_sequences(self) -> int:
+        """Number of sequences in the tracked batch."""
+        return self._meta["n_sequences"]
+
+    def for_sequence(self, index: int) -> "LogitTrackingProcessor":
+        """A view of this tracker whose analysis methods report on sequence `index`.
+
+        The view shares all stored data with this tracker.
+        """
+        if not 0 <= index < max(self.n_sequences, 1):
+            raise IndexError(f"Sequence {index} out of range for a batch of {self.n_sequences}")
+        view = copy(self)
+        view.batch_index = index
+        return view
+
+    def _rows(self, buffer: Union[RowBuffer, CachedSoftmax]) -> NDArray:
+        """Host copy of the selected sequence's rows, one per position."""
+        rows = buffer.to_numpy()
+        if len(rows) == 0:
+            return np.empty((0, self.vocab_size))
+        return rows[:, self.batch_index]
+
+    def _sparse_rows(self, which: str, probs: bool) -> SparseRows:
+        values = self._top_unstructured if which == "unstructured" else self._top_structured
+        log_normalizers = self._rows(self._log_normalizers)
+        column = 0 if which == "unstructured" else 1
+        return SparseRows(
+            self._rows(self._top_indices),
+            self._rows(values),
+            self.vocab_size,
+            fill=0.0 if probs else -np.inf,
+            log_normalizers=log_normalizers[:, column] if probs and len(log_normalizers) else None
+        )
+
+    @property
+    def unstructured_logits(self) -> List[NDArray]:
+        if self.top_k is not None:
+            return self._sparse_rows("unstructured", probs=False)
+        return list(self._rows(self._unstructured))
+
+    @property
+    def structured_logits(self) -> List[NDArray]:
+        if self.top_k is not None:
+            return self._sparse_rows("structured", probs=False)
+        return list(self._rows(self._structured))
+
+    @property
+    def chosen_tokens(self) -> List[int]:
+        if len(self._chosen) == 0:
+            return []
+        return self._rows(self._chosen).tolist()
+
+    def process_logits(self, input_ids: Array, logits: Array) -> Array:
+        """Process logits and store them.
+
+        This method:
+        1. Stores the raw logits from the model
+        2. Applies any structural constraints if a processor exists
+        3. Stores the constrained logits
+        4. Tracks the chosen token ID
+
+        Parameters
+        ----------
+        input_ids : Array
+            The input token ids for each sequence in the batch
+        logits : Array
+            The original logits to process, shape (batch_size, vocab_size).
+            Every row of the batch is stored.
+
+        Returns
+        -------
+        Array
+            The processed logits, shape (batch_size, vocab_size)
+
+        Notes
+        -----
+        - For unconstrained generation (no processor), structured = unstructured
+        - Token IDs are tracked from input_ids to ensure we capture the actual choices
+        - The first step of a generation clears the previous trace
+        """
+        self._start_generation(input_ids)
+        self._meta["n_sequences"], self._meta["vocab_size"] = logits.shape
+
+        # Store the actual chosen token IDs if available
+        if input_ids.shape[-1] > 0:
+            self._chosen.append(input_ids[:, -1])
+
+        if self.stats_only:
+            # Taken before the processor, which may mask logits in place
+            natural = torch.log_softmax(logits.float(), dim=-1)
+            processed = self.processor.process_logits(input_ids, logits) if self.processor is not None else logits
+            self._capture_stats(input_ids, natural, processed)
+            return processed
+
+        if self.top_k is not None:
+            # Processors may mask logits in place, so keep the raw rows
+            raw = logits.clone()
+            processed = self.processor.process_logits(input_ids, logits) if self.processor is not None else logits
+            self._capture_top_k(raw, processed)
+            return processed
+
+        # Always store the raw logits as unstructured. This must happen before
+        # the constraint is applied, since processors may mask logits in place.
+        self._unstructured.append(logits)
+
+        # Apply structural constraints if we have a processor
+        if self.processor is not None:
+            processed = self.processor.process_logits(input_ids, logits)
+            self._structured.append(processed)
+            return processed
+
+        # For unconstrained generation, structured = unstructured
+        self._structured.append(logits)
+        return logits
+
+    def _start_generation(self, input_ids: torch.Tensor):
+        """Clear the stored trace if this step starts a new generation.
+
+        A step continues the current generation when this copy of the
+        processor has already run and the input grew by exactly one token
+        for the same batch. Anything else (a new copy from Outlines, or a
+        processor reused directly with another prompt or batch size) starts
+        over, so buffers are never appended rows of a different shape.
+        """
+        shape = tuple(input_ids.shape)
+        previous = self._meta["input_shape"]
+        continues = self._generating and previous is not None and shape == (previous[0], previous[1] + 1)
+        if not continues:
+            self.clear()
+        self._generating = True
+        self._meta["input_shape"] = shape
+
+    def _capture_top_k(self, unstructured: torch.Tensor, structured: torch.Tensor):
+        """Store the sparse capture of every sequence for one position, without leaving the device."""
+        log_normalizers = torch.stack([torch.logsumexp(unstructured, dim=-1), torch.logsumexp(structured, dim=-1)],
+                                      dim=-1)
+
+        # Rank tokens by the larger of their natural and constrained probability
+        score = torch.maximum(unstructured - log_normalizers[:, :1], structured - log_normalizers[:, 1:])
+        top_indices = torch.topk(score, min(self.top_k, score.shape[-1]), dim=-1).indices
+
+        self._top_indices.append(top_indices)
+        self._top_unstructured.append(unstructured.gather(-1, top_indices))
+        self._top_structured.append(structured.gather(-1, top_indices))
+        self._log_normalizers.append(log_normalizers)
+        self._allowed.append(pack_mask(torch.isfinite(structured)))
+
+    def _capture_stats(self, input_ids: torch.Tensor, natural: torch.Tensor, structured: torch.Tensor):
+        """Store one position's constraint statistics for every sequence, without leaving the device."""
+        constrained = torch.log_softmax(structured.float(), dim=-1)
+        allowed = torch.isfinite(constrained)
+        zero = natural.new_zeros(())
+
+        natural_probs = natural.exp()
+        constrained_probs = constrained.exp()
+        self._stats.append(torch.stack([
+            torch.logsumexp(natural.masked_fill(~allowed, -float("inf")), dim=-1).exp(),
+            torch.where(allowed, constrained_probs * (constrained - natural), zero).sum(dim=-1),
+            -torch.where(torch.isfinite(natural), natural_probs * natural, zero).sum(dim=-1),
+            -torch.where(allowed, constrained_probs * constrained, zero).sum(dim=-1),
+        ], dim=-1))
+
+        # The token chosen at the previous step is the last input id now
+        previous = self._last_step["log_probs"]
+        if previous is not None:
+            if tuple(input_ids.shape) == (previous.shape[0], self._last_step["length"] + 1):
+                chosen = input_ids[:, -1:].to(previous.device)
+                rank = (previous > previous.gather(-1, chosen)).sum(dim=-1)
+            else:
+                rank = torch.full((previous.shape[0],), -1, dtype=torch.long, device=previous.device)
+            self._chosen_rank.append(rank)
+        self._last_step.update(log_probs=natural, length=input_ids.shape[-1])
+
+    def get_step_stats(self) -> Dict[str, NDArray]:
+        """Per-step constraint statistics of the selected sequence (stats_only mode).
+
+        Returns
+        -------
+        Dict[str, NDArray]
+            Arrays of shape (n_positions,):
+            - allowed_mass: Natural probability of the tokens the constraint allowed
+            - kl_divergence: KL(constrained || natural), in nats
+            - natural_entropy: Entropy of the natural distribution, in nats
+            - constrained_entropy: Entropy of the constrained distribution, in nats
+            - chosen_rank: Rank of the chosen token in the natural
+              distribution (0 = the model's top choice), -1 where unknown,
+              as for the last step of each generation
+        """
+        n_positions = len(self._stats)
+        stats = self._rows(self._stats) if n_positions else np.empty((0, len(STAT_COLUMNS)), dtype=np.float32)
+        result = {name: stats[:, i] for i, name in enumerate(STAT_COLUMNS)}
+
+        chosen_rank = np.full(n_positions, -1, dtype=np.int64)
+        if len(self._chosen_rank):
+            ranks = self._rows(self._chosen_rank)[:n_positions]
+            chosen_rank[:len(ranks)] = ranks
+        result["chosen_rank"] = chosen_rank
+
+        return result
+
+    def get_allowed_mask(self) -> NDArray:
+        """Which tokens the constraint allowed at each position.
+
+        Returns
+        -------
+        NDArray
+            Boolean array of shape (n_positions, vocab_size)
+        """
+        if self.top_k is not None:
+            packed = self._rows(self._allowed).astype(np.uint8)
+            return np.unpackbits(packed, axis=-1)[:, :self.vocab_size].astype(bool)
+        return np.isfinite(self._rows(self._structured))
+
+    def _require_logits(self, method: str):
+        """Raise a clear error for methods that read logits the capture mode does not keep."""
+        if self.stats_only:
+            raise ValueError(f"{method} needs logits, which stats_only mode does not keep; "
+                             "track with the dense or top_k capture mode")
+
+    def get_batch_logits(self) -> Dict[str, NDArray]:
+        """Get the logits of every sequence in the batch at once.
+
+        In top-k mode, logits outside the captured tokens are -inf.
+
+        Returns
+        -------
+        Dict[str, NDArray]
+            Contains:
+            - unstructured: Raw logits, shape (n_sequences, n_positions, vocab_size)
+            - structured: Logits after constraints, same shape
+
+        Raises
+        ------
+        ValueError
+            In stats_only mode, which keeps no logits
+        """
+        self._require_logits("get_batch_logits")
+        if self.n_positions == 0:
+            empty = np.empty((self.n_sequences, 0, self.vocab_size))
+            return {'unstructured': empty, 'structured': empty}
+
+        if self.top_k is None:
+            return {
+                'unstructured': self._unstructured.to_numpy().transpose(1, 0, 2),
+                'structured': self._structured.to_numpy().transpose(1, 0, 2)
+            }
+
+        shape = (self.n_positions, self.n_sequences, self.vocab_size)
+        indices = self._top_indices.to_numpy()
+        batch = {}
+        for which, buffer in (('unstructured', self._top_unstructured), ('structured', self._top_structured)):
+            dense = np.full(shape, -np.inf, dtype=np.float32)
+            np.put_along_axis(dense, indices, buffer.to_numpy(), axis=-1)
+            batch[which] = dense.transpose(1, 0, 2)
+        return batch
+
+    def get_probabilities(self, as_matrix: bool = False) -> Dict[str, Union[List[NDArray], NDArray]]:
+        """Get probability distributions computed from stored logits.
+
+        Parameters
+        ----------
+        as_matrix : bool
+            If True, convert probability lists to matrices.
+            Each matrix will have shape (vocab_size, n_positions)
+
+        Returns
+        -------
+        Dict[str, Union[List[NDArray], NDArray]]
+            Contains:
+            - unstructured: Raw probability distributions
+            - structured: Probability distributions after constraints
+            Each can be either a list of arrays or a single matrix
+        """
+        if self.top_k is not None:
+            unstructured = self._sparse_rows("unstructured", probs=True)
+            structured = self._sparse_rows("structured", probs=True)
+            if as_matrix:
+                return {'unstructured': unstructured.to_matrix().T, 'structured': structured.to_matrix().T}
+            return {'unstructured': unstructured, 'structured': structured}
+
+        # Probabilities are computed once per position and cached
+        unstructured_probs = self._rows(self._unstructured_probs)
+        structured_probs = self._rows(self._structured_probs)
+
+        if as_matrix:
+            # One column per position
+            unstructured = unstructured_probs.T
+            structured = structured_probs.T
+        else:
+            # Return as lists
+            unstructured = list(unstructured_probs)
+            structured = list(structured_probs)
+
+        return {
+            'unstructured': unstructured,
+            'structured': structured
+        }
+
+    def get_logits(self, as_matrix: bool = False) -> Dict[str, Union[List[NDArray], NDArray]]:
+        """Get the stored logit values.
+
+        Parameters
+        ----------
+        as_matrix : bool
+            If True, convert logit lists to matrices.
+            Each matrix will have shape (vocab_size, n_positions)
+
+        Returns
+        -------
+        Dict[str, Union[List[NDArray], NDArray]]
+            Contains:
+            - unstructured: Raw logit values
+            - structured: Logit values after constraints
+            Each can be either a list of arrays or a single matrix
+        """
+        if as_matrix and self.top_k is not None:
+            unstructured = self.unstructured_logits.to_matrix().T
+            structured = self.structured_logits.to_matrix().T
+        elif as_matrix:
+            unstructured = self._rows(self._unstructured).T
+            structured = self._rows(self._structured).T
+        else:
+            unstructured = self.unstructured_logits
+            structured = self.structured_logits
+
+        return {
+            'unstructured': unstructured,
+            'structured': structured
+        }
+
+    def get_top_tokens(
+            self,
+            k: int = 10,
+            positions: Optional[Union[int, List[int]]] = None,
+            include_logits: bool = True
+    ) -> List[Dict[str, Any]]:
+        """Get the top k tokens at specified positions with their probabilities and logits.
+
+        Parameters
+        ----------
+        k : int, optional
+            Number of top tokens to return, by default 10
+        positions : Union[int, List[int]], optional
+            Position(s) to analyze. Can be a single position or list of positions.
+            By default analyzes all positions.
+        include_logits : bool, optional
+            Whether to include raw logit values in addition to probabilities
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            List of dictionaries, one per position, containing:
+            - position: Position in sequence
+            - text_so_far: Text generated up to this position
+            - tokens: List of top k token dictionaries, each containing:
+                - token: The token string
+                - natural_prob: Unconstrained probability
+                - constrained_prob: Probability after constraints
+                - natural_logit: Raw logit value (if include_logits=True)
+                - constrained_logit: Constrained logit value (if include_logits=True)
+                - is_chosen: Whether this token was actually chosen
+
+        Raises
+        ------
+        ValueError
+            In stats_only mode, which keeps no logits
+        """
+        self._require_logits("get_top_tokens")
+
+        # Convert single position to list
+        if positions is None:
+            positions = list(range(self.n_positions))
+        elif isinstance(positions, int):
+            positions = [positions]
+
+        positions = [pos for pos in positions if pos < self.n_positions]
+
+        # Get probabilities and logits, one row per position
+        probs = self.get_probabilities(as_matrix=True)
+        u_probs, s_probs = probs['unstructured'].T, probs['structured'].T
+        if include_logits:
+            logits = self.get_logits(as_matrix=True)
+            u_logits, s_logits = logits['unstructured'].T, logits['structured'].T
+
+        # Get vocab mapping
+        vocab = self.get_vocab_mapping()
+
+        # Get top k indices by maximum probability, for all positions at once
+        top_indices_by_pos = top_k_indices(np.maximum(u_probs[positions], s_probs[positions]), k)
+
+        results = []
+        for pos, top_indices in zip(positions, top_indices_by_pos):
+            # Get text generated so far
+            text_so_far = self.sequence(pos)
+
+            # Get the actual next token for comparison
+            next_token = self.sequence(pos + 1)[len(text_so_far):] if pos < self.n_positions - 1 else ""
+
+            # Build token info list
+            tokens = []
+            for idx in top_indices:
+                token = vocab[idx]
+                token_info = {
+                    'token': token,
+                    'natural_prob': float(u_probs[pos, idx]),
+                    'constrained_prob': float(s_probs[pos, idx]),
+                    'is_chosen': token == next_token
+                }
+
+                if include_logits:
+                    token_info.update({
+                        'natural_logit': float(u_logits[pos, idx]),
+                        'constrained_logit': float(s_logits[pos, idx])
+                    })
+
+                tokens.append(token_info)
+
+            results.append({
+                'position': pos,
+                'text_so_far': text_so_far,
+                'tokens': tokens
+            })
+
+        return results
+
+    def get_vocab_mapping(self) -> List[str]:
+        """Get the mapping from vocabulary indices to token strings.
+
+        Returns
+        -------
+        List[str]
+            List of token strings, where index matches vocabulary index
+
+        Raises
+        ------
+        AttributeError
+            If no tokenizer is available
+        """
+        if self.vocab_tokens is None:
+            if not hasattr(self, 'tokenizer'):
+                raise AttributeError("No tokenizer available for mapping tokens")
+
+            # Shared with other trackers on the same tokenizer, and cached on disk
+            tokenizer = getattr(self.processor, 'tokenizer', self.tokenizer)
+            self.vocab_tokens = vocab_strings(tokenizer, self.vocab_size)
+
+        return self.vocab_tokens
+
+    def clear(self):
+        """Clear all stored logits."""
+        for buffer in (self._unstructured, self._structured, self._chosen, self._top_indices,
+                       self._top_unstructured, self._top_structured, self._log_normalizers, self._allowed,
+                       self._stats, self._chosen_rank):
+            buffer.clear()
+        self._last_step.update(log_probs=None, length=0)
+
+    def to_dataframe(
+            self,
+            show: Literal["probs", "logits"] = "probs",
+            top_k: Optional[int] = None,
+            min_value: Optional[float] = None
+    ) -> "pd.DataFrame":
+        """Convert tracking data to a pandas DataFrame for analysis.
+
+        Parameters
+        ----------
+        show : Literal["probs", "logits"], optional
+            Whether to show probabilities or logit values, by default "probs"
+        top_k : Optional[int], optional
+            If provided, only include the top k tokens at each position
+            (based on maximum of structured/unstructured values)
+        min_value : Optional[float], optional
+            If provided, only include tokens with values >= min_value
+            in either structured or unstructured distribution
+
+        Returns
+        -------
+        pd.DataFrame
+            DataFrame built from the stored arrays without per-token Python
+            loops. Rows are ordered by position, then by token id, or by
+            decreasing value when top_k is given. Columns:
+            - position: Token position in sequence
+            - token: String representation of token (categorical)
+            - natural: Raw model values (probs/logits)
+            - constrained: Values after constraints
+
+        Examples
+        --------
+        >>> # Get probability data for top 10 tokens
+        >>> df = processor.to_dataframe(show="probs", top_k=10)
+        >>> df.sort_values("natural", ascending=False).head()
+        >>>
+        >>> # Get logit data above threshold
+        >>> df = processor.to_dataframe(show="logits", min_value=-5)
+        >>> df.query("position == 0").nlargest(5, "natural")
+        >>>
+        >>> # Get all tokens with probability > 1%
+        >>> df = processor.to_dataframe(show="probs", min_value=0.01)
+
+        Raises
+        ------
+        ImportError
+            If pandas is not installed
+        """
+        if not PANDAS_AVAILABLE:
+            raise ImportError(
+                "pandas is required for DataFrame support. "
+                "Please install it with: pip install pandas"
+            )
+
+        # Get values based on show parameter, one row per position
+        if show == "probs":
+            values = self.get_probabilities(as_matrix=True)
+        else:
+            values = self.get_logits(as_matrix=True)
+        natural = values['unstructured'].T
+        constrained = values['structured'].T
+        n_positions, vocab_size = natural.shape
+
+        # Select (position, token id) pairs for all positions at once
+        if top_k is None and min_value is None:
+            # No filters: include all tokens
+            positions = np.repeat(np.arange(n_positions), vocab_size)
+            indices = np.tile(np.arange(vocab_size), n_positions)
+        else:
+            # Filter on the maximum of the structured/unstructured values
+            max_vals = np.maximum(natural, constrained)
+
+            if top_k is not None:
+                # Top k per position, largest first
+                indices = top_k_indices(max_vals, top_k)
+                positions = np.broadcast_to(np.arange(n_positions)[:, None], indices.shape)
+
+                if min_value is not None:
+                    # Both filters: top k among values >= min_value
+                    keep = np.take_along_axis(max_vals, indices, axis=1) >= min_value
+                    positions, indices = positions[keep], indices[keep]
+                else:
+                    positions, indices = positions.ravel(), indices.ravel()
+            else:
+                # Just threshold: all values >= min_value
+                positions, indices = np.nonzero(max_vals >= min_value)
+
+        categories, codes = self._token_codes()
+
+        return pd.DataFrame({
+            'position': positions,
+            'token': pd.Categorical.from_codes(codes[indices], categories=categories),
+            'natural': natural[positions, indices],
+            'constrained': constrained[positions, indices]
+        })
+
+    def _token_codes(self):
+        """Unique token strings and the category code of every token id, for categorical columns."""
+        vocab = self.get_vocab_mapping()
+        if self._token_categories is None or self._token_categories[0] is not vocab:
+            # Several ids can decode to the same string, so categories are the unique strings
+            categories, codes = np.unique(np.asarray(vocab, dtype=object), return_inverse=True)
+            self._token_categories = (vocab, categories, codes)
+        return self._token_categories[1:]
+
+    def sequence(self, pos: Optional[int] = None) -> str:
+        """Get the sequence of tokens generated up to a position.
+
+        Parameters
+        ----------
+        pos : Optional[int], optional
+            Position to reconstruct up to (exclusive).
+            If None, returns the entire sequence.
+
+        Returns
+        -------
+        str
+            The concatenated string of chosen tokens. A position inside an
+            incomplete multi-byte character gives the text before it.
+
+        Raises
+        ------
+        AttributeError
+            If no tokenizer is available for decoding
+        """
+        n_tokens = len(self._chosen)
+        if n_tokens == 0:
+            return ""
+
+        # Number of tokens up to the specified position, with slice semantics
+        end_pos = n_tokens if pos is None else pos
+        return self._text_index().prefix(len(range(n_tokens)[:end_pos]))
+
+    def _text_index(self) -> DecodedTextIndex:
+        """The selected sequence's text index, extended to every chosen token."""
+        n_tokens = len(self._chosen)
+        generation, index = self._text_indexes.get(self.batch_index, (None, None))
+        if generation == self._chosen.generation and len(index.tokens) >= n_tokens:
+            return index
+
+        if not hasattr(self, 'tokenizer'):
+            raise AttributeError("No tokenizer available for decoding sequence")
+
+        # Get the tokenizer
+        if hasattr(self.processor, 'tokenizer'):
+            tokenizer = self.processor.tokenizer
+        else:
+            tokenizer = self.tokenizer
+
+        # Decode only the tokens chosen since the last call
+        if generation != self._chosen.generation:
+            # Outlines tokenizers decode a batch, so the ids are passed as one sequence
+            index = DecodedTextIndex(lambda ids: tokenizer.decode([ids])[0])
+            self._text_indexes[self.batch_index] = (self._chosen.generation, index)
+        index.extend(self._rows(self._chosen)[len(index.tokens):].tolist())
+        return index
+
+    def save(self, path: str):
+        """Save the trace of every sequence to a directory.
+
+        Each non-empty buffer is written as `<name>.npy`, shape (n_positions,
+        n_sequences, ...). `trace.json` holds the sizes, a digest of the
+        tokenizer, the vocabulary and the decoded text of each sequence; the
+        last three are omitted when no tokenizer is available.
+
+        Parameters
+        ----------
+        path : str
+            Directory to write to, created if missing
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in TRACE_ARRAYS:
+            rows = getattr(self, f"_{name}").to_numpy()
+            file_path = os.path.join(path, f"{name}.npy")
+            if len(rows):
+                np.save(file_path, rows)
+            elif os.path.exists(file_path):
+                os.remove(file_path)  # Left over from an earlier trace
+
+        trace = {
+            "format": TRACE_FORMAT,
+            "vocab_size": self.vocab_size,
+            "n_sequences": self.n_sequences,
+            "top_k": self.top_k,
+            "stats_only": self.stats_only,
+            "tokenizer": None,
+            "vocab": self.vocab_tokens,
+            "texts": None
+        }
+        if hasattr(self, 'tokenizer'):
+            trace["tokenizer"] = tokenizer_digest(getattr(self.processor, 'tokenizer', self.tokenizer))
+            trace["vocab"] = self.get_vocab_mapping()
+        try:
+            indexes = [self.for_sequence(i)._text_index() for i in range(self.n_sequences)]
+            trace["texts"] = [{"tokens": index.tokens, "text": index.text, "offsets": index.offsets}
+                              for index in indexes]
+        except AttributeError:
+            pass  # No tokenizer to decode with
+
+        # Written last, so a directory without it holds no complete trace
+        tmp_path = os.path.join(path, f"{TRACE_FILE}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, TRACE_FILE))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "c") -> "LogitTrackingProcessor":
+        """Load a trace written by `save`, memory-mapping its arrays.
+
+        Nothing is read until it is used: the analysis methods and plots
+        only page in the positions they index. Probabilities are still
+        computed over all positions on first use. The loaded tracker is
+        read-only and has no tokenizer, so `get_vocab_mapping` and
+        `sequence` answer from the saved vocabulary and text.
+
+        Parameters
+        ----------
+        path : str
+            Directory written by `save`
+        mmap_mode : Optional[str], optional
+            Passed to `np.load`. The default "c" maps the files copy-on-write;
+            None reads them into memory.
+
+        Returns
+        -------
+        LogitTrackingProcessor
+            Tracker holding the saved trace, reporting on sequence 0
+        """
+        with open(os.path.join(path, TRACE_FILE), "r", encoding="utf-8") as f:
+            trace = json.load(f)
+        if trace.get("format") != TRACE_FORMAT:
+            raise ValueError(f"Unsupported trace format {trace.get('format')!r} in {path}")
+
+        tracking = cls(top_k=trace["top_k"], stats_only=trace.get("stats_only", False))
+        for name in TRACE_ARRAYS:
+            file_path = os.path.join(path, f"{name}.npy")
+            if os.path.exists(file_path):
+                getattr(tracking, f"_{name}").wrap(np.load(file_path, mmap_mode=mmap_mode))
+
+        tracking._meta.update(vocab_size=trace["vocab_size"], n_sequences=trace["n_sequences"])
+        tracking.vocab_tokens = trace["vocab"]
+        for i, saved in enumerate(trace["texts"] or []):
+            index = DecodedTextIndex(decode=None)
+            index.tokens, index.text, index.offsets = saved["tokens"], saved["text"], saved["offsets"]
+            tracking._text_indexes[i] = (tracking._chosen.generation, index)
+
+        return tracking
+
+
+def track_logits(generator: "Generator", top_k: Optional[int] = None, stats_only: bool = False) -> "Generator":
+    """Add probability tracking to any generator.
+
+    This is a convenience function that wraps a generator's logits processor
+    with a LogitTrackingProcessor, enabling analysis of token probabilities
+    during generation.
+
+    Parameters
+    ----------
+    generator : Generator
+        The generator to add tracking to
+    top_k : Optional[int], optional
+        If set, keep only a sparse top-k capture per position
+        (see LogitTrackingProcessor)
+    stats_only : bool, optional
+        If True, keep only per-step constraint statistics
+        (see LogitTrackingProcessor.get_step_stats)
+
+    Returns
+    -------
+    Generator
+        The same generator with tracking enabled
+
+    Examples
+    --------
+    >>> # Track probabilities for unconstrained text generation
+    >>> generator = generate.text(model)
+    >>> generator = track_logits(generator)
+    >>>
+    >>> # Track probabilities for JSON generation
+    >>> generator = generate.json(model, schema)
+    >>> generator = track_logits(generator)
+    >>>
+    >>> # Keep only the 20 most likely tokens per position for long generations
+    >>> generator = track_logits(generate.json(model, schema), top_k=20)
+    >>>
+    >>> # Cheap per-step telemetry for production generations
+    >>> generator = track_logits(generate.json(model, schema), stats_only=True)
+    >>> generator(prompt)
+    >>> generator.logits_processor.get_step_stats()["allowed_mass"]
+    >>>
+    >>> # Batched generation tracks every sequence
+    >>> generator(["First prompt", "Second prompt"])
+    >>> generator.logits_processor.for_sequence(1).get_top_tokens(k=5)
+    """
+    # If there's no logits_processor, throw an error. Logit tracking
+    # is currently only supported for structured generators.
+    if generator.logits_processor is None:
+        raise ValueError("Logit tracking is not supported for this generator")
+
+    # Create tracking processor, wrapping any existing processor
+    tracking = LogitTrackingProcessor(generator.logits_processor, top_k=top_k, stats_only=stats_only)
+
+    # Add tokenizer for token mapping
+    if hasattr(generator.logits_processor, 'tokenizer'):
+        tracking.tokenizer = generator.logits_processor.tokenizer
+
+    # Set as the generator's processor
+    generator.logits_processor = tracking
+
+    return generator
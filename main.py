@@ -1,16 +1,14 @@
 # main.py
-import argparse
-
-import instructor_demo
-
 import warnings
-from openai import OpenAI
+from functools import lru_cache
 from pydantic import BaseModel
-from typing import Optional, List, Literal
-from groq import Groq
+from typing import Optional, Literal
 from dotenv import load_dotenv
 import os
 
+from completion_cache import CompletionCache, completion_key
+from usage_tracking import http_client, record_usage, summarize_usage, track_call
+
 load_dotenv()  # This loads the variables from the .env file
 
 KEY = os.getenv("KEY")
@@ -18,9 +16,19 @@ KEY = os.getenv("KEY")
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
-# Initialize Groq client
+# Groq client, created on the first request, timing each request to the first byte
+
+@lru_cache(maxsize=None)
+def get_client():
+    from groq import Groq
+
+    return Groq(api_key=KEY, http_client=http_client("groq"))
 
-client = Groq(api_key=KEY)
+# Completions are reused across reruns; set NO_COMPLETION_CACHE=1 to measure latency
+@lru_cache(maxsize=None)
+def get_completion_cache():
+    """Create the completion cache, and its directory, on first use."""
+    return CompletionCache()
 
 
 
@@ -45,9 +53,8 @@ mentions = [
 ]
 
 def analyze_mention(mention: str, personality: str = "rude") -> Mention:
-    completion = client.chat.completions.create(
-        model="llama3-70b-8192",
-        messages=[
+    model = "llama3-70b-8192"
+    messages = [
             {"role": "system", "content": f"""
             Extract structured information from social media mentions about our products.
 
@@ -70,9 +77,18 @@ def analyze_mention(mention: str, personality: str = "rude") -> Mention:
             Only reply with valid JSON. Do not change the field names.
             """},
             {"role": "user", "content": mention},
-        ]
-    )
-    raw = completion.choices[0].message.content.strip()
+    ]
+
+    key = completion_key(model, messages, schema=Mention.model_json_schema())
+    raw = get_completion_cache().get(key)
+    if raw is None:
+        completion = get_client().chat.completions.create(
+            model=model,
+            messages=messages
+        )
+        record_usage(completion)
+        raw = completion.choices[0].message.content.strip()
+        get_completion_cache().set(key, raw)
     print(type(raw))
     print(raw)
 
@@ -83,17 +99,28 @@ def analyze_mention(mention: str, personality: str = "rude") -> Mention:
         print(f"Failed to parse AI response: {raw}")
         raise e
 
-responses = []
 
-for mention in mentions:
-    try:
-        response = analyze_mention(mention, personality="rude")
-        responses.append(response)
-    except Exception as e:
-        print(f"Error analyzing mention: {mention}")
-        print(e)
+def main():
+    responses = []
+    usages = []
+
+    for mention in mentions:
+        with track_call() as call:
+            try:
+                response = analyze_mention(mention, personality="rude")
+                responses.append(response)
+            except Exception as e:
+                response = None
+                print(f"Error analyzing mention: {mention}")
+                print(e)
+        usages.append(call.summary(success=response is not None))
+
+    print(responses)
+    print(summarize_usage(usages))
+
 
-print(responses)
+if __name__ == "__main__":
+    main()
 
 # class User(BaseModel):
 #     name: str
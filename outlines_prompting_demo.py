@@ -1,13 +1,13 @@
+import os
 import time
 import warnings
-from typing import Literal
 import json
+from copy import copy
+from functools import lru_cache
 from dotenv import load_dotenv
-from outlines import generate  # Correct import for JSON generation
-from outlines.models import Transformers
-from outlines.samplers import greedy
-from pydantic import BaseModel
-from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from cases import cases_from_env
+from results_sink import JsonlResultsSink, case_key, completed_cases, rebuild_results_json, write_json
 
 # Load environment variables
 load_dotenv()
@@ -15,227 +15,148 @@ load_dotenv()
 # Suppress warnings
 warnings.filterwarnings('ignore')
 
-# Load model and tokenizer
-model_name = "HuggingFaceTB/SmolLM2-135M-Instruct"
-hf_model = AutoModelForCausalLM.from_pretrained(model_name)
-tokenizer = AutoTokenizer.from_pretrained(model_name)
+# The model is loaded and wrapped on first use, so importing this module stays cheap
+MODEL_ID = "HuggingFaceTB/SmolLM2-135M-Instruct"
+SAMPLER_ID = "greedy"
+
+
+@lru_cache(maxsize=None)
+def load_model():
+    """Load the model and tokenizer, once."""
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    hf_model = AutoModelForCausalLM.from_pretrained(MODEL_ID)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
+    return hf_model, tokenizer
+
+
+# Compiled JSON generators, reused across prompts that share a schema.
+# Set GENERATOR_CACHE_DIR to also keep the compiled FSM indexes on disk.
+GENERATOR_CACHE_SIZE = 16
+GENERATOR_CACHE_DIR = os.getenv("GENERATOR_CACHE_DIR")
+_generator_cache = None
+
+
+def get_generator_cache(reset=False):
+    """Return the generator cache, wrapping the model for Outlines on first use.
+
+    With reset=True the Outlines wrapper and the cache are rebuilt around the
+    already loaded model.
+    """
+    global _generator_cache
+    if _generator_cache is None or reset:
+        from outlines.models import Transformers
+        from generator_cache import GeneratorCache
+
+        hf_model, tokenizer = load_model()
+        outlines_model = Transformers(hf_model, tokenizer)
+        _generator_cache = GeneratorCache(outlines_model, maxsize=GENERATOR_CACHE_SIZE, cache_dir=GENERATOR_CACHE_DIR)
+    return _generator_cache
+
+
+# Batch mode groups prompts by schema and sends each group through the model
+# as one padded batch instead of one prompt at a time.
+BATCH_MODE = os.getenv("BATCH_MODE", "0") == "1"
+MAX_BATCH_SIZE = 8
+
+# Results are appended to RESULTS_LOG as each test finishes; the summary and
+# the detailed RESULTS_FILE are written once at the end of the sweep.
+RESULTS_LOG = "outlines_test_results.jsonl"
+SUMMARY_FILE = "outlines_test_summary.json"
+RESULTS_FILE = "outlines_test_results.json"
+
+# With PROFILE_TOKENS=1, each sequential generation is timed per token (time
+# to first token, inter-token latency, mask cost). Records hold the
+# percentiles of their generation; PROFILE_TOKENS_RAW=1 also keeps the raw
+# per-token timings in them.
+PROFILE_TOKENS = os.getenv("PROFILE_TOKENS", "0") == "1"
+PROFILE_TOKENS_RAW = os.getenv("PROFILE_TOKENS_RAW", "0") == "1"
 
-# Initialize Outlines model wrapper
-outlines_model = Transformers(hf_model, tokenizer)
+# With RESUME=1, cases already in RESULTS_LOG for this model and sampler are
+# skipped and only the missing ones are generated.
+RESUME = os.getenv("RESUME", "0") == "1"
+
+
+# Seconds allowed per generation (fractions allowed). At the deadline the
+# model is made to emit EOS, so generation stops cleanly on any thread.
+GENERATION_TIMEOUT = float(os.getenv("GENERATION_TIMEOUT", "30"))
 
 
-##################### schemas ###################################
-
-class NameYear(BaseModel):
-    name: str
-    year: int
-
-
-class Car(BaseModel):
-    make: str
-    model: str
-    year: int
-
-
-class Person(BaseModel):
-    name: str
-    age: int
-    occupation: str
-
-
-class Fruit(BaseModel):
-    name: str
-    color: str
-    sweetness_level: int
-
-
-class SimpleAnimal(BaseModel):
-    species: str
-    habitat: str
-    diet: str
-
-
-class Country(BaseModel):
-    name: str
-    capital: str
-    population_millions: int
-
-
-class Book(BaseModel):
-    title: str
-    author: str
-    published_year: int
-
-
-class Movie(BaseModel):
-    title: str
-    director: str
-    release_year: int
-
-
-class City(BaseModel):
-    name: str
-    country: str
-    population: int
-
-
-class Product(BaseModel):
-    id: int
-    name: str
-    price_usd: float
-
-
-class Complicated(BaseModel):
-    a: Literal["cat", "dog", "animal"]
-    b: int
-    c: bool
-
-
-# # Test cases
-prompts = [
-    ("Give me a JSON object with your name and the year you were created.", NameYear),
-    ("Create a JSON where the name contains special characters @#$ and year is negative", NameYear),
-    ("Generate output with name as empty string and year as 3.14 (should be integer)", NameYear),
-    ("Return data with extra field 'timestamp' that shouldn't be present", NameYear),
-    ("Generate a JSON object containing your name, the year of your creation, and the organization that developed you.",
-     NameYear),
-    ("List your name, creation year, and the programming languages you're proficient in.", NameYear),
-    ("Describe a car with make, model, year, and engine type.", Car),
-    ("Provide details of a car including make, model, year, and fuel efficiency in km/l.", Car),
-    ("List a car's make, model, year, and whether it's electric or gasoline-powered.", Car),
-    ("Provide a car's make, model, year, and its safety rating out of 5", Car),
-    ("Create a JSON object for a person including name, age, occupation, and nationality.", Person),
-    ("List a person's name, age, occupation, and years of experience in their field.", Person),
-    ("Provide details of a person with name, age, occupation, and their highest educational qualification.", Person),
-    ("Generate a JSON object for a person including name, age, occupation, and marital status.", Person),
-    ("Describe a person with name, age, occupation, and their primary language.", Person),
-    ("Provide a JSON object for a fruit including name, color, sweetness level, and average weight in grams.", Fruit),
-    ("List a fruit's name, color, sweetness level, and its season of availability.", Fruit),
-    ("Generate details of a fruit with name, color, sweetness level, and vitamin C content in mg.", Fruit),
-    ("Describe a fruit including name, color, sweetness level, and whether it's tropical or temperate.", Fruit),
-    ("Provide a fruit's name, color, sweetness level, and common culinary uses.", Fruit),
-    ("Create a JSON object for an animal including species, habitat, diet, and average lifespan in years.",
-     SimpleAnimal),
-    ("List an animal's species, habitat, diet, and its conservation status.", SimpleAnimal),
-    ("Provide details of an animal with species, habitat, diet, and typical group behavior (e.g., solitary, pack).",
-     SimpleAnimal),
-    ("Describe an animal including species, habitat, diet, and its primary predators.", SimpleAnimal),
-    ("Generate a JSON object for an animal with species, habitat, diet, and whether it's nocturnal or diurnal.",
-     SimpleAnimal),
-    ("Provide a JSON object for a country including name, capital, population in millions, and official language.",
-     Country),
-    ("List a country's name, capital, population in millions, and its currency.", Country),
-    ("Generate details of a country with name, capital, population in millions, and its form of government.", Country),
-    ("Describe a country including name, capital, population in millions, and its primary export.", Country),
-    ("Provide a country's name, capital, population in millions, and its continent.", Country),
-    ("Create a JSON object for a book including title, author, published year, and genre.", Book),
-    ("List a book's title, author, published year, and number of pages.", Book),
-    ("Provide details of a book with title, author, published year, and its ISBN number.", Book),
-    ("Describe a book including title, author, published year, and its target audience", Book),
-    ("Generate a JSON object for a book with title, author, published year, and whether it's part of a series.", Book),
-    ("Provide a JSON object for a movie including title, director, release year, and genre.", Movie),
-    ("List a movie's title, director, release year, and its main actor.", Movie),
-    ("Generate details of a movie with title, director, release year, and its duration in minutes.", Movie),
-    ("Describe a movie including title, director, release year, and its box office earnings in USD.", Movie),
-    ("Provide a movie's title, director, release year, and its IMDb rating.", Movie),
-    ("Create a JSON object for a city including name, country, population, and area in square kilometers.", City),
-    ("List a city's name, country, population, and its founding year.", City),
-    ("Provide details of a city with name, country, population, and its primary language.", City),
-    ("Describe a city including name, country, population, and its major industries.", City),
-    ("Generate a JSON object for a city with name, country, population, and its average annual temperature in Celsius.",
-     City),
-    ("Provide a JSON object for a product including id, name, price in USD, and category.", Product),
-    ("List a product's id, name, price in USD, and its manufacturer.", NameYear),
-    ("Generate details of a product with id, name, price in USD, and its stock availability.", NameYear),
-    ("Describe a product including id, name, price in USD, and its warranty period in months.", NameYear),
-    ("Provide a product's id, name, price in USD, and its average customer rating out of 5.", NameYear),
-    ("Create a JSON object with your name, year of creation, and your primary function or role.", NameYear),
-    ("Provide your name, the year you were created, and the version number of your current iteration.", NameYear),
-    ("Produce output where the name is 12345 (should be string) and year is 'two thousand'", NameYear),
-    ("Create JSON with unicode name 𝔘𝔫𝔦𝔠𝔬𝔡𝔢 and year 0x10 (hexadecimal)", NameYear),
-    ("Generate car data where make is 123 and model is True (should be strings)", Car),
-    ("Return JSON where model contains newlines and tabs", Car),
-    ("Produce car data with year 'twenty twenty three'", Car),
-    ("Generate output where make is null and model is extremely long string", Car),
-    ("Return a JSON object describing a car with make, model, and year.", Car),
-    ("Create person data with age 'thirty-five'", Person),
-    ("Generate output where occupation is a list ['teacher', 'writer'] instead of string", Person),
-    ("Return JSON with nested address object that shouldn't exist", Person),
-    ("Output a JSON object listing the name, age, and occupation of a person.", Person),
-    ("Create a JSON object for a fruit with name, color, and sweetness level.", Fruit),
-    ("Generate fruit data where sweetness_level is 'very sweet' instead of integer", Fruit),
-    ("Create JSON with color as RGB array [255,0,0] instead of string", Fruit),
-    ("Return output with name in ALL CAPS and negative sweetness", Fruit),
-    ("Produce fruit data with extra 'expiry_date' field", Fruit),
-    ("Generate output where color is 7 (should be string)", Fruit),
-    ("Create animal data where diet is a dictionary {main: 'plants', occasional: 'meat'}", SimpleAnimal),
-    ("Generate output with habitat as integer 42 instead of string", SimpleAnimal),
-    ("Return JSON where species contains XML tags <species>Wolf</species>", SimpleAnimal),
-    ("Produce animal data with missing 'diet' field", SimpleAnimal),
-    ("Generate output with all fields set to null", SimpleAnimal),
-    ("Give me a JSON object for an animal with species, habitat, and diet.", SimpleAnimal),
-    ("Describe a country in JSON with name, capital, and population (in millions).", Country),
-    ("Output a JSON object for a book with title, author, and published year.", Book),
-    ("Describe a movie in JSON with title, director, and release year.", Movie),
-    ("Create movie data where release_year is in future (2100)", Movie),
-    ("Generate output with director as list ['Director1', 'Director2']", Movie),
-    ("Return JSON where title is Unicode 𝕋𝕙𝕖 𝕄𝕒𝕥𝕣𝕚𝕩", Movie),
-    ("Produce movie data with release_year as string '2000'", Movie),
-    ("Generate output with extra 'sequels' field", Movie),
-    ("Give me a JSON object for a city with name, country, and population.", City),
-    ("Create city data where population is 'about one million'", City),
-    ("Generate output with country as country code 'US' instead of full name", City),
-    ("Produce city data with population as scientific notation 1e6", City),
-    ("Generate output with missing 'country' field", City),
-    ("Create product data where price_usd is '$19.99' with dollar sign", Product),
-    ("Generate output with id as string '123' instead of integer", Product),
-    ("Return JSON where name contains HTML <b>Premium</b>", Product),
-    ("Produce product data with negative price", Product),
-    ("Generate output with extra 'discount' field", Product),
-    ("Describe a product with ID, name, and price in USD as JSON.", Product),
-    ("Create data where a is 'CAT' (uppercase not in Literal)", Complicated),
-    ("Generate output where b is True instead of integer", Complicated),
-    ("Return JSON where c is 'yes' instead of boolean", Complicated),
-    ("Produce data with missing 'a' field", Complicated),
-    ("Generate output where all values are null", Complicated),
-    ("Give me a JSON object for values in a, b and c", Complicated)
-]
-
-import signal
-from contextlib import contextmanager
-
-# Add timeout decorator
 class TimeoutException(Exception):
-    pass
-
-@contextmanager
-def time_limit(seconds):
-    def signal_handler(signum, frame):
-        raise TimeoutException(f"Timed out after {seconds} seconds")
-    signal.signal(signal.SIGALRM, signal_handler)
-    signal.alarm(seconds)
+    """Generation was cut off at its deadline before producing a valid output.
+
+    Attributes
+    ----------
+    partial_output : Optional[str]
+        Text generated before the deadline
+    completion_tokens : Optional[int]
+        Number of tokens in partial_output
+    """
+
+    def __init__(self, message, partial_output=None, completion_tokens=None):
+        super().__init__(message)
+        self.partial_output = partial_output
+        self.completion_tokens = completion_tokens
+
+
+def parse_output(generator, raw, forced, seconds):
+    """Parse a raw generation into the schema.
+
+    An output whose EOS was forced at the deadline and that does not parse
+    raises TimeoutException with the partial text; one that parses anyway is
+    kept. Outputs that ended on their own fail with their parse error.
+    """
     try:
-        yield
-    finally:
-        signal.alarm(0)
+        return generator.format_sequence(raw)
+    except Exception:
+        if not forced:
+            raise
+        _, tokenizer = load_model()
+        raise TimeoutException(f"Timed out after {seconds} seconds", partial_output=raw,
+                               completion_tokens=len(tokenizer(raw, add_special_tokens=False)["input_ids"]))
+
 
 def generate_resp(response_model, user_prompt):
+    """Generate one response.
+
+    Returns the event, the duration and the per-token profile (None unless
+    PROFILE_TOKENS=1).
+    """
     try:
-        generator = generate.json(
-            outlines_model,
+        from outlines.samplers import greedy
+
+        from deadline import with_deadline
+
+        generator = get_generator_cache().get(
             response_model,
             sampler=greedy(),
             whitespace_pattern=r'[\n ]'
         )
+        # Wrap a copy, so the cached generator stays unwrapped. It returns the
+        # raw string, so the partial output survives a timeout.
+        raw_generator = copy(generator)
+        raw_generator.format_sequence = lambda x: x
+        profiler = None
+        if PROFILE_TOKENS:
+            from profiling import profile_logits
+
+            raw_generator = profile_logits(raw_generator)
+            profiler = raw_generator.logits_processor
+        raw_generator = with_deadline(raw_generator, GENERATION_TIMEOUT)
+        deadline = raw_generator.logits_processor
+
         print("RESPONSE MODEL", response_model)
         start_time = time.time()
-        # Add timeout for generation
-        with time_limit(30):  # 30 second timeout
-            event = generator(user_prompt)
+        deadline.start()
+        if profiler is not None:
+            profiler.start()
+        raw = raw_generator(user_prompt)
         end_time = time.time()
         duration = end_time - start_time
 
-        return event, duration
+        event = parse_output(generator, raw, any(deadline.forced_sequences), GENERATION_TIMEOUT)
+
+        return event, duration, profiler.profile() if profiler is not None else None
 
     except TimeoutException:
         print("Generation timed out")
@@ -245,142 +166,274 @@ def generate_resp(response_model, user_prompt):
         raise
 
 
-results = []
-success_count = 0
-failure_count = 0
-model_stats = {}
+def generate_batch(response_model, user_prompts):
+    """Generate responses for several prompts sharing a schema in one padded batch.
 
-# Initialize model statistics
-for _, schema in prompts:
-    model_name = schema.__name__
-    if model_name not in model_stats:
-        model_stats[model_name] = {
-            'success': 0,
-            'failure': 0,
-            'total': 0
-        }
+    The logits processor keeps a separate FSM state for every sequence in the
+    batch, so each element is constrained independently. Outputs are parsed one
+    by one, so an invalid element does not fail the rest of the batch. At the
+    deadline every unfinished element is cut off and fails with
+    TimeoutException; elements that had already finished are parsed as usual.
 
-for index, (prompt, schema) in enumerate(prompts, start=1):
-    success = False
-    event = None
-    model_name = schema.__name__
-    model_stats[model_name]['total'] += 1
+    Returns a list of (event, error) pairs in prompt order, and the batch duration.
+    """
+    try:
+        from outlines.samplers import greedy
 
-    duration = None
+        from deadline import with_deadline
+
+        generator = get_generator_cache().get(
+            response_model,
+            sampler=greedy(),
+            whitespace_pattern=r'[\n ]'
+        )
+        # Same generator, but returning the raw strings so we can parse per element
+        raw_generator = copy(generator)
+        raw_generator.format_sequence = lambda x: x
+        # Same total time budget as generating the prompts one after another
+        seconds = GENERATION_TIMEOUT * len(user_prompts)
+        raw_generator = with_deadline(raw_generator, seconds)
+        deadline = raw_generator.logits_processor
+
+        print("RESPONSE MODEL", response_model, "BATCH SIZE", len(user_prompts))
+        start_time = time.time()
+        deadline.start()
+        completions = raw_generator(user_prompts)
+        end_time = time.time()
+        duration = end_time - start_time
 
-    try:
-        print(f"\nProcessing test {index}/{len(prompts)}: {prompt[:50]}...")
-        event, duration = generate_resp(schema, prompt)
-        success = True
-        success_count += 1
-        model_stats[model_name]['success'] += 1
-    except TimeoutException:
-        print(f"[{index}] Generation timed out - skipping")
-        failure_count += 1
-        model_stats[model_name]['failure'] += 1
-        continue
-    except json.JSONDecodeError as e:
-        print(f"[{index}] JSON Decode Error: {str(e)}")
-        failure_count += 1
-        model_stats[model_name]['failure'] += 1
-    except ValueError as e:
-        print(f"[{index}] Value Error: {str(e)}")
-        failure_count += 1
-        model_stats[model_name]['failure'] += 1
     except Exception as e:
-        print(f"[{index}] Unexpected Error: {str(e)}")
-        failure_count += 1
-        model_stats[model_name]['failure'] += 1
-        # Add model reset to recover from bad states
+        print(f"Batch generation error: {str(e)}")
+        raise
+
+    forced = deadline.forced_sequences or [False] * len(completions)
+    outcomes = []
+    for raw, was_forced in zip(completions, forced):
         try:
-            outlines_model = Transformers(hf_model, tokenizer)
-            print("Model reset performed")
-        except Exception as reset_error:
-            print(f"Model reset failed: {str(reset_error)}")
-            break  # Can't continue if we can't reset the model
+            outcomes.append((parse_output(generator, raw, was_forced, seconds), None))
+        except Exception as e:
+            outcomes.append((None, e))
+
+    return outcomes, duration
+
+
+def sequential_outcomes(cases):
+    """Yield (index, prompt, schema, outcome) for each case, generating one prompt at a time.
+
+    `outcome` is a zero-argument callable that returns (event, duration, profile) or raises.
+    """
+    for index, prompt, schema in cases:
+        yield index, prompt, schema, lambda schema=schema, prompt=prompt: generate_resp(schema, prompt)
+
+
+def batched_outcomes(cases):
+    """Yield (index, prompt, schema, outcome) for each case, generating by schema in batches.
+
+    Cases are grouped by schema in order of first appearance and split into
+    batches of at most MAX_BATCH_SIZE. Each case's duration is its share of the
+    batch wall time. `outcome` returns (event, duration, None) or raises the
+    error generation produced for that case; batches are not profiled per token.
+    """
+    groups = {}
+    for index, prompt, schema in cases:
+        groups.setdefault(schema, []).append((index, prompt))
+
+    def make_outcome(event, duration, error):
+        def outcome():
+            if error is not None:
+                raise error
+            return event, duration, None
+        return outcome
+
+    for schema, members in groups.items():
+        for start in range(0, len(members), MAX_BATCH_SIZE):
+            batch = members[start:start + MAX_BATCH_SIZE]
+            try:
+                outcomes, duration = generate_batch(schema, [prompt for _, prompt in batch])
+                share = duration / len(batch)
+            except Exception as e:
+                outcomes, share = [(None, e)] * len(batch), None
+
+            for (index, prompt), (event, error) in zip(batch, outcomes):
+                yield index, prompt, schema, make_outcome(event, share, error)
+
+
+def main():
+    # Test cases (filter with CASE_SCHEMAS, CASE_TAGS and CASE_RANGE)
+    selected_cases = cases_from_env()
+    prompts = [(case.prompt, case.schema) for case in selected_cases]
+
+    results = []
+    profiles = {}  # schema name -> per-token profiles from this run
+    success_count = 0
+    failure_count = 0
+    model_stats = {}
+
+    # Initialize model statistics
+    for _, schema in prompts:
+        model_name = schema.__name__
+        if model_name not in model_stats:
+            model_stats[model_name] = {
+                'success': 0,
+                'failure': 0,
+                'total': 0
+            }
+
+    cases = [(case.test_id, case.prompt, case.schema) for case in selected_cases]
+
+    if RESUME:
+        completed = completed_cases(RESULTS_LOG)
+        pending = []
+        for index, prompt, schema in cases:
+            record = completed.get(case_key(prompt, schema.__name__, MODEL_ID, SAMPLER_ID))
+            if record is None:
+                pending.append((index, prompt, schema))
+                continue
+
+            # Merge the earlier result into the aggregates
+            results.append(record)
+            model_stats[schema.__name__]['total'] += 1
+            if record["success"]:
+                success_count += 1
+                model_stats[schema.__name__]['success'] += 1
+            else:
+                failure_count += 1
+                model_stats[schema.__name__]['failure'] += 1
+
+        print(f"Resuming: {len(cases) - len(pending)} cases already completed, {len(pending)} to run")
+        cases = pending
+
+    sink = JsonlResultsSink(RESULTS_LOG, append=RESUME)
+    outcomes = batched_outcomes(cases) if BATCH_MODE else sequential_outcomes(cases)
+
+    for index, prompt, schema, outcome in outcomes:
+        success = False
+        event = None
+        model_name = schema.__name__
+        model_stats[model_name]['total'] += 1
+
+        duration = None
+        profile = None
+        timeout = None
 
-    try:
-        results.append({
-            "test_id": index,
-            "prompt": prompt,
-            "schema": model_name,
-            "success": success,
-            "output": event.model_dump() if event else None,
-            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "duration_seconds": round(duration, 4) if duration is not None else None
-        })
-    except Exception as e:
-        print(f"[{index}] Error storing results: {str(e)}")
-        results.append({
+        try:
+            print(f"\nProcessing test {index}/{len(prompts)}: {prompt[:50]}...")
+            event, duration, profile = outcome()
+            success = True
+            success_count += 1
+            model_stats[model_name]['success'] += 1
+        except TimeoutException as e:
+            print(f"[{index}] Generation timed out after {e.completion_tokens} tokens")
+            timeout = e
+            failure_count += 1
+            model_stats[model_name]['failure'] += 1
+        except json.JSONDecodeError as e:
+            print(f"[{index}] JSON Decode Error: {str(e)}")
+            failure_count += 1
+            model_stats[model_name]['failure'] += 1
+        except ValueError as e:
+            print(f"[{index}] Value Error: {str(e)}")
+            failure_count += 1
+            model_stats[model_name]['failure'] += 1
+        except Exception as e:
+            print(f"[{index}] Unexpected Error: {str(e)}")
+            failure_count += 1
+            model_stats[model_name]['failure'] += 1
+            # Add model reset to recover from bad states
+            try:
+                get_generator_cache(reset=True)
+                print("Model reset performed")
+            except Exception as reset_error:
+                print(f"Model reset failed: {str(reset_error)}")
+                break  # Can't continue if we can't reset the model
+
+        record = {
             "test_id": index,
             "prompt": prompt,
             "schema": model_name,
+            "model": MODEL_ID,
+            "sampler": SAMPLER_ID,
             "success": success,
             "output": event.model_dump() if event else None,
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
-            "duration_seconds": round(duration, 4) if duration is not None else None
-        })
-
-    # Save intermediate results after each test
-    try:
-        result_data = {
-            "metadata": {
-                "model": model_name,
-                "test_date": time.strftime("%Y-%m-%d"),
-                "total_tests": len(prompts),
-                "tests_completed": index,
-                "success_rate": (success_count / index) * 100 if index > 0 else 0,
-                "failure_rate": (failure_count / index) * 100 if index > 0 else 0
-            },
-            "model_stats": model_stats,
-            "detailed_results": results
+            "duration_seconds": round(duration, 4) if duration is not None else None,
+            "profile": None,
+            "timed_out": timeout is not None,
+            "partial_output": timeout.partial_output if timeout is not None else None,
+            "partial_tokens": timeout.completion_tokens if timeout is not None else None
         }
+        if profile is not None:
+            from profiling import summarize_profiles
 
-        with open("outlines_test_results.json", "w") as f:
-            json.dump(result_data, f, indent=4)
-    except Exception as e:
-        print(f"Error saving intermediate results: {str(e)}")
-
-# Calculate overall statistics
-total_tests = len(prompts)
-success_rate = (success_count / total_tests) * 100
-failure_rate = (failure_count / total_tests) * 100
-total_duration = sum(r['duration_seconds'] for r in results)
-avg_duration = total_duration / total_tests
-print(f"Average Time per Prompt: {avg_duration:.2f} seconds")
-print(f"Total Time Taken: {total_duration:.2f} seconds")
-
-
-
-print("\n=== TEST SUMMARY ===")
-print(f"\nTotal Tests: {total_tests}")
-print(f"Successes: {success_count} ({success_rate:.2f}%)")
-print(f"Failures: {failure_count} ({failure_rate:.2f}%)")
-
-print("\n=== MODEL PERFORMANCE ===")
-for model, stats in model_stats.items():
-    success_pct = (stats['success'] / stats['total']) * 100 if stats['total'] > 0 else 0
-    print(f"\n{model}:")
-    print(f"  Success Rate: {success_pct:.2f}% ({stats['success']}/{stats['total']})")
-
-# Save detailed results with metadata
-result_data = {
-    "metadata": {
-        "model": model_name,
-        "test_date": time.strftime("%Y-%m-%d"),
-        "total_tests": total_tests,
-        "success_rate": success_rate,
-        "failure_rate": failure_rate,
-        "total_duration_seconds": total_duration,
-        "average_time_per_prompt": avg_duration
-
-    },
-    "model_stats": model_stats,
-    "detailed_results": results
-}
-
-with open("outlines_test_results.json", "w") as f:
-    json.dump(result_data, f, indent=4)
-
-print("\n=== DETAILED RESULTS SAVED ===")
-print("Saved to outlines_test_results.json")
\ No newline at end of file
+            profiles.setdefault(model_name, []).append(profile)
+            record["profile"] = summarize_profiles([profile])
+            if PROFILE_TOKENS_RAW:
+                record["profile_raw"] = profile
+        results.append(record)
+
+        # Append this test to the results log
+        try:
+            sink.append(record)
+        except Exception as e:
+            print(f"[{index}] Error storing results: {str(e)}")
+
+    sink.close()
+
+    # Calculate overall statistics
+    total_tests = len(prompts)
+    success_rate = (success_count / total_tests) * 100
+    failure_rate = (failure_count / total_tests) * 100
+    total_duration = sum(r['duration_seconds'] for r in results if r['duration_seconds'] is not None)
+    avg_duration = total_duration / total_tests
+    print(f"Average Time per Prompt: {avg_duration:.2f} seconds")
+    print(f"Total Time Taken: {total_duration:.2f} seconds")
+    print(f"Generator cache: {get_generator_cache().hits} hits, {get_generator_cache().misses} compilations")
+
+
+
+    print("\n=== TEST SUMMARY ===")
+    print(f"\nTotal Tests: {total_tests}")
+    print(f"Successes: {success_count} ({success_rate:.2f}%)")
+    print(f"Failures: {failure_count} ({failure_rate:.2f}%)")
+
+    # Per-token latency percentiles per schema, pooled over the cases profiled in this run
+    if profiles:
+        from profiling import summarize_profiles
+
+        for model, schema_profiles in profiles.items():
+            model_stats[model]['token_latency'] = summarize_profiles(schema_profiles)
+
+    print("\n=== MODEL PERFORMANCE ===")
+    for model, stats in model_stats.items():
+        success_pct = (stats['success'] / stats['total']) * 100 if stats['total'] > 0 else 0
+        print(f"\n{model}:")
+        print(f"  Success Rate: {success_pct:.2f}% ({stats['success']}/{stats['total']})")
+        latency = stats.get('token_latency')
+        if latency:
+            print(f"  TTFT p50: {latency['ttft_p50']:.3f}s, inter-token p50: {latency['inter_token_p50'] * 1000:.1f}ms, "
+                  f"mask p50: {latency['mask_p50'] * 1000:.2f}ms ({latency['mask_share']:.1%} of generation time)")
+
+    # Save the compact summary, then rebuild the detailed results file from the log
+    summary = {
+        "metadata": {
+            "model": MODEL_ID,
+            "test_date": time.strftime("%Y-%m-%d"),
+            "total_tests": total_tests,
+            "success_rate": success_rate,
+            "failure_rate": failure_rate,
+            "total_duration_seconds": total_duration,
+            "average_time_per_prompt": avg_duration
+
+        },
+        "model_stats": model_stats
+    }
+
+    write_json(SUMMARY_FILE, summary)
+    rebuild_results_json(RESULTS_LOG, SUMMARY_FILE, RESULTS_FILE)
+
+    print("\n=== DETAILED RESULTS SAVED ===")
+    print(f"Saved to {RESULTS_FILE} (log: {RESULTS_LOG}, summary: {SUMMARY_FILE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Per-token timing of Outlines generation.
+
+`profile_logits` wraps a generator's logits processor with a
+`ProfilingLogitsProcessor`, in the same way `track_logits` does. The model
+calls the processor once per generated token, after the forward pass and
+before sampling, so timestamping each call splits a generation into:
+
+- time to first token: from `start()` to the end of the first step
+  (tokenization, prompt prefill and the first mask)
+- inter-token latency: between the ends of consecutive steps (one forward
+  pass, the mask and sampling)
+- mask time: inside the wrapped processor (FSM state update and masking)
+
+On CUDA the device is synchronized around each step, so the timestamps
+measure finished work rather than kernel launches.
+
+    generator = profile_logits(copy(generator))
+    generator.logits_processor.start()
+    generator(prompt)
+    generator.logits_processor.profile()
+"""
+import time
+from copy import copy
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import torch
+
+from outlines.processors.base_logits_processor import OutlinesLogitsProcessor, Array
+
+from stats import percentile
+
+if TYPE_CHECKING:
+    from outlines.generate import Generator
+
+PERCENTILES = (50, 90, 99)
+
+
+class ProfilingLogitsProcessor(OutlinesLogitsProcessor):
+    """Timestamps every generation step and the time spent in the wrapped processor.
+
+    Attributes
+    ----------
+    processor : Optional[OutlinesLogitsProcessor]
+        The processor that applies structural constraints. If None, logits
+        pass through unchanged and only step times are recorded.
+    synchronize : Optional[bool]
+        Whether to synchronize the device around each step. None means only
+        for CUDA tensors.
+    """
+
+    def __init__(self, processor=None, synchronize: Optional[bool] = None):
+        self.processor = processor
+        self.synchronize = synchronize
+        if hasattr(processor, 'tokenizer'):
+            self.tokenizer = processor.tokenizer
+        # Mutated rather than reassigned, so it is shared with Outlines' copies
+        self._timing = {"start": None, "steps": []}  # steps: (end time, seconds in the processor)
+
+    def __copy__(self):
+        """Copy the wrapped processor too, so its guide state starts fresh.
+
+        Outlines copies the logits processor for every generation call. The
+        timings stay shared with the copy.
+        """
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        if self.processor is not None:
+            clone.processor = copy(self.processor)
+        return clone
+
+    def start(self):
+        """Forget earlier steps and start the clock for time to first token.
+
+        Call this right before the generator. Without it, the clock starts
+        at the first step and time to first token excludes the prefill.
+        """
+        self._timing["steps"].clear()
+        self._timing["start"] = time.perf_counter()
+
+    def process_logits(self, input_ids: Array, logits: Array) -> Array:
+        """Apply the wrapped processor, timing the step."""
+        synchronize = logits.is_cuda if self.synchronize is None else self.synchronize
+        if synchronize:
+            torch.cuda.synchronize(logits.device)
+        entered = time.perf_counter()
+        if self._timing["start"] is None:
+            self._timing["start"] = entered
+
+        processed = self.processor.process_logits(input_ids, logits) if self.processor is not None else logits
+
+        if synchronize:
+            torch.cuda.synchronize(logits.device)
+        finished = time.perf_counter()
+        self._timing["steps"].append((finished, finished - entered))
+
+        return processed
+
+    @property
+    def n_steps(self) -> int:
+        """Number of steps timed since `start`."""
+        return len(self._timing["steps"])
+
+    def profile(self) -> Dict[str, Any]:
+        """Timings of the generation since `start`.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Contains:
+            - ttft_seconds: Time to first token, or None if no step ran
+            - inter_token_seconds: Time between consecutive steps, one per token after the first
+            - mask_seconds: Time in the wrapped processor, one per step
+        """
+        steps = self._timing["steps"]
+        ends = [end for end, _ in steps]
+
+        return {
+            "ttft_seconds": ends[0] - self._timing["start"] if steps else None,
+            "inter_token_seconds": [later - earlier for earlier, later in zip(ends, ends[1:])],
+            "mask_seconds": [seconds for _, seconds in steps]
+        }
+
+
+def summarize_profiles(profiles: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """Percentiles over several generations' profiles, pooling their per-token timings.
+
+    Returns ttft, inter_token and mask percentiles (keys like `ttft_p50`,
+    `inter_token_p90`, `mask_p99`), the number of generations and tokens, and
+    mask_share, the fraction of generation time spent in the processor.
+    """
+    ttfts = [p["ttft_seconds"] for p in profiles if p["ttft_seconds"] is not None]
+    inter_token = [s for p in profiles for s in p["inter_token_seconds"]]
+    mask = [s for p in profiles for s in p["mask_seconds"]]
+    total = sum(ttfts) + sum(inter_token)
+
+    summary = {"generations": len(profiles), "tokens": len(mask)}
+    for name, values in (("ttft", ttfts), ("inter_token", inter_token), ("mask", mask)):
+        for q in PERCENTILES:
+            summary[f"{name}_p{q}"] = percentile(values, q)
+    summary["mask_share"] = sum(mask) / total if total else None
+
+    return summary
+
+
+def profile_logits(generator: "Generator", synchronize: Optional[bool] = None) -> "Generator":
+    """Add per-step timing to a generator.
+
+    Wraps the generator's logits processor, if it has one, in a
+    ProfilingLogitsProcessor. The generator is modified in place, so pass a
+    copy of a cached generator.
+
+    Parameters
+    ----------
+    generator : Generator
+        The generator to profile
+    synchronize : Optional[bool]
+        See ProfilingLogitsProcessor
+
+    Returns
+    -------
+    Generator
+        The same generator, whose `logits_processor` holds the timings
+    """
+    generator.logits_processor = ProfilingLogitsProcessor(generator.logits_processor, synchronize=synchronize)
+    return generator
@@ -0,0 +1,285 @@
+"""
+Append-only storage for benchmark results.
+
+Each test result is appended as one JSON line to a `.jsonl` file as soon as it
+is available, so the cost of saving is constant per test and a crash loses at
+most the line being written. Writes are flushed after every record and fsynced
+periodically.
+
+Because every finished case is on disk, an interrupted sweep can be resumed:
+`completed_cases` keys the existing records by (prompt, schema, model,
+sampler) so only the missing cases need to run.
+
+At the end of a sweep a compact summary file is written, and the detailed
+`*_test_results.json` layout used by the demo scripts can be rebuilt from the
+two files at any time:
+
+    python results_sink.py outlines_test_results.jsonl outlines_test_summary.json outlines_test_results.json
+
+After a crash there is no summary for the records yet (or only a stale one
+from an earlier run). Leave it out, and the totals and per-schema counts are
+computed from the records:
+
+    python results_sink.py outlines_test_results.jsonl outlines_test_results.json
+"""
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+
+class JsonlResultsSink:
+    """Appends result records to a JSON Lines file.
+
+    Attributes
+    ----------
+    path : str
+        The `.jsonl` file records are written to
+    fsync_every : int
+        Number of records between calls to `os.fsync`
+    records_written : int
+        Number of records appended through this sink
+    """
+
+    def __init__(self, path: str, fsync_every: int = 10, append: bool = False):
+        """Open the sink.
+
+        Parameters
+        ----------
+        path : str
+            The `.jsonl` file to write to
+        fsync_every : int, optional
+            Number of records between calls to `os.fsync`, by default 10
+        append : bool, optional
+            If True, keep existing records and append after them. A
+            truncated last line is cut off first, so the next record starts
+            on a line of its own. If False, start a new file.
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.records_written = 0
+        if append:
+            _end_last_line(path)
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def append(self, record: Dict[str, Any]):
+        """Write one record as a single line."""
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.records_written += 1
+
+        if self.records_written % self.fsync_every == 0:
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Flush, fsync and close the file."""
+        if self._file.closed:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _end_last_line(path: str, chunk_size: int = 65536):
+    """Make sure a `.jsonl` file ends with a newline before appending to it.
+
+    A last line left without its newline by a crash mid-write is cut off, or
+    just terminated if it holds a complete record.
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        # Find the end of the last complete line, reading backwards
+        line_end = end
+        while line_end > 0:
+            start = max(0, line_end - chunk_size)
+            f.seek(start)
+            newline = f.read(line_end - start).rfind(b"\n")
+            if newline != -1:
+                line_end = start + newline + 1
+                break
+            line_end = start
+
+        if line_end == end:
+            return
+        f.seek(line_end)
+        try:
+            json.loads(f.read().decode("utf-8"))
+        except ValueError:
+            print(f"Dropping incomplete record at the end of {path}")
+            f.truncate(line_end)
+        else:
+            f.write(b"\n")
+
+
+def read_records(path: str) -> List[Dict[str, Any]]:
+    """Read all complete records from a `.jsonl` file.
+
+    A truncated last line, left behind by a crash mid-write, is skipped.
+    """
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Skipping incomplete record in {path}")
+
+    return records
+
+
+def case_key(prompt: str, schema: str, model: str, sampler: str) -> tuple:
+    """Identify a benchmark case across runs."""
+    return (prompt, schema, model, sampler)
+
+
+def completed_cases(path: str, schema_field: str = "schema") -> Dict[tuple, Dict[str, Any]]:
+    """Map the case key of every record already in a `.jsonl` log to its record.
+
+    Used to resume a sweep: cases whose key is present do not need to run again.
+    Records written before `model` and `sampler` were recorded are ignored,
+    and so are records of generations cut off at their deadline
+    (`timed_out`), so a resumed sweep runs those cases again.
+
+    Parameters
+    ----------
+    path : str
+        The `.jsonl` file written by `JsonlResultsSink`
+    schema_field : str, optional
+        Name of the record field holding the schema name, by default "schema"
+
+    Returns
+    -------
+    Dict[tuple, Dict[str, Any]]
+        Records keyed by `case_key`; for duplicate keys the last record wins
+    """
+    completed = {}
+    for record in read_records(path):
+        if "model" not in record or "sampler" not in record or record.get("timed_out"):
+            continue
+        key = case_key(record["prompt"], record[schema_field], record["model"], record["sampler"])
+        completed[key] = record
+
+    return completed
+
+
+def write_json(path: str, data: Dict[str, Any], indent: int = None):
+    """Atomically write `data` as JSON, so readers never see a half-written file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def latest_records(records: List[Dict[str, Any]], sort_key: str = "test_id") -> List[Dict[str, Any]]:
+    """Keep only the last record of each case, e.g. a timed-out case rerun by a resumed sweep.
+
+    Cases are identified by `sort_key`, model and sampler; records without
+    `sort_key` are all kept.
+    """
+    latest = {}
+    for i, record in enumerate(records):
+        key = (record[sort_key], record.get("model"), record.get("sampler")) if sort_key in record else i
+        latest.pop(key, None)
+        latest[key] = record
+    return list(latest.values())
+
+
+def summarize_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals and per-schema success counts computed from result records.
+
+    Stands in for the summary written at the end of a sweep. Records name
+    their schema in `schema` (Outlines) or `expected_schema` (Instructor).
+    """
+    model_stats = {}
+    for record in records:
+        stats = model_stats.setdefault(record.get("schema", record.get("expected_schema")),
+                                       {"success": 0, "failure": 0, "total": 0})
+        stats["success" if record.get("success") else "failure"] += 1
+        stats["total"] += 1
+
+    total = len(records)
+    successes = sum(stats["success"] for stats in model_stats.values())
+    total_duration = sum(r.get("duration_seconds") or 0 for r in records)
+
+    return {
+        "metadata": {
+            "total_tests": total,
+            "success_count": successes,
+            "failure_count": total - successes,
+            "success_rate": successes / total * 100 if total else 0,
+            "failure_rate": (total - successes) / total * 100 if total else 0,
+            "total_duration_seconds": total_duration,
+            "average_time_per_prompt": total_duration / total if total else 0,
+            "computed_from_records": True
+        },
+        "model_stats": model_stats
+    }
+
+
+def rebuild_results_json(records_path: str, summary_path: Optional[str], output_path: str,
+                         sort_key: str = "test_id"):
+    """Rebuild the detailed results JSON from a records file and a summary file.
+
+    The output has the summary's top-level keys (e.g. `metadata` and
+    `model_stats`) followed by `detailed_results`, written with `indent=4`.
+
+    When a case was recorded more than once, only its last record is kept
+    (see `latest_records`).
+
+    Parameters
+    ----------
+    records_path : str
+        The `.jsonl` file written by `JsonlResultsSink`
+    summary_path : Optional[str]
+        The compact summary JSON written at the end of the sweep. If None,
+        missing, or older than the records (a crashed sweep after an
+        earlier complete one), the summary is computed from the records
+        with `summarize_records`.
+    output_path : str
+        Where to write the rebuilt JSON
+    sort_key : str, optional
+        Record field used to order `detailed_results`, by default "test_id"
+    """
+    records = latest_records(read_records(records_path), sort_key)
+
+    if (summary_path is not None and os.path.exists(summary_path)
+            and os.path.getmtime(summary_path) >= os.path.getmtime(records_path)):
+        with open(summary_path, encoding="utf-8") as f:
+            result_data = json.load(f)
+    else:
+        if summary_path is not None:
+            print(f"No summary for the records in {summary_path}, computing it from {records_path}")
+        result_data = summarize_records(records)
+
+    if records and all(sort_key in r for r in records):
+        records.sort(key=lambda r: r[sort_key])
+    result_data["detailed_results"] = records
+
+    write_json(output_path, result_data, indent=4)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python results_sink.py RECORDS.jsonl [SUMMARY.json] OUTPUT.json")
+        sys.exit(1)
+
+    records_path, *summary_path, output_path = sys.argv[1:]
+    rebuild_results_json(records_path, summary_path[0] if summary_path else None, output_path)
+    print(f"Rebuilt {output_path}")
@@ -0,0 +1,286 @@
+"""
+A retry scheduler with a single retry and token budget per run.
+
+Every completion issued during the run, including the reasks Instructor makes
+internally after a validation error, is charged against the same budgets.
+Failures are classified before deciding whether to try again:
+
+- transient: rate limits, timeouts, connection and server errors. These are
+  retried with exponential backoff and full jitter.
+- validation: the model answered but the answer did not parse or match the
+  schema even after Instructor's reasks. Sending the identical request again
+  is unlikely to help, so these are not retried.
+- fatal: anything else (bad request, authentication, ...). Not retried.
+- budget: the run's retry or token budget was exhausted.
+
+Instructor wraps every error of a call in `InstructorRetryException`, API
+errors included, so the exception it wraps is classified instead.
+
+The scheduler hands each attempt the number of completions it may issue,
+counting the first one: the internal retries it allows plus one. Instructor's
+`max_retries` counts reasks instead, so convert it with
+`instructor_max_retries`.
+"""
+import json
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+from pydantic import ValidationError
+
+try:
+    from instructor.core import InstructorRetryException, ResponseParsingError
+    from instructor.core import ValidationError as InstructorValidationError
+except ImportError:
+    InstructorRetryException = ResponseParsingError = InstructorValidationError = None
+
+TRANSIENT = "transient"
+VALIDATION = "validation"
+FATAL = "fatal"
+BUDGET = "budget"
+
+
+class BudgetExhausted(Exception):
+    pass
+
+
+def classify_failure(error: Exception) -> str:
+    """Classify an exception raised by a completion call.
+
+    Parameters
+    ----------
+    error : Exception
+        The exception raised by the call
+
+    Returns
+    -------
+    str
+        One of TRANSIENT, VALIDATION, FATAL or BUDGET
+    """
+    error = _underlying_error(error)
+    if isinstance(error, BudgetExhausted):
+        return BUDGET
+    if isinstance(error, (ValidationError, json.JSONDecodeError)):
+        return VALIDATION
+    if InstructorRetryException is not None and isinstance(error, (ResponseParsingError, InstructorValidationError)):
+        return VALIDATION
+    if isinstance(error, (RateLimitError, APITimeoutError, APIConnectionError)):
+        return TRANSIENT
+    if isinstance(error, APIStatusError) and error.status_code >= 500:
+        return TRANSIENT
+    return FATAL
+
+
+def _underlying_error(error: Exception) -> Exception:
+    """The error behind an InstructorRetryException: its last failed attempt, or its cause.
+
+    API errors are raised before any attempt is recorded, so they are only
+    found through `__cause__`.
+    """
+    while InstructorRetryException is not None and isinstance(error, InstructorRetryException):
+        failed_attempts = getattr(error, "failed_attempts", None)
+        cause = failed_attempts[-1].exception if failed_attempts else error.__cause__
+        if cause is None:
+            break
+        error = cause
+    return error
+
+
+def instructor_max_retries(attempts: int) -> int:
+    """Instructor's `max_retries` for a call allowed `attempts` completions.
+
+    Instructor makes the first completion plus one reask per retry, i.e.
+    `max_retries + 1` completions at most.
+    """
+    return max(attempts - 1, 0)
+
+
+class RetryScheduler:
+    """Runs completion calls against a shared retry and token budget.
+
+    Register `on_completion_kwargs` and `on_completion_response` as Instructor
+    hooks ("completion:kwargs" and "completion:response") so that every
+    completion, including internal reasks, is counted and timed.
+
+    Attributes
+    ----------
+    retry_budget : int
+        Completions allowed beyond the first attempt of each call, for the whole run
+    token_budget : Optional[int]
+        Total tokens allowed for the whole run. If None, tokens are only counted.
+    max_attempts : int
+        Maximum number of top-level attempts for a single call
+    base_delay : float
+        Backoff delay in seconds before the first retry
+    max_delay : float
+        Upper bound for the backoff delay in seconds
+    retries_spent : int
+        Retries charged so far
+    tokens_spent : int
+        Tokens used by all completions so far
+    completions : int
+        Completions issued so far
+    time_lost : float
+        Seconds spent on completions that were discarded and on backoff
+    failures : Dict[str, int]
+        Number of failed calls per failure kind
+    """
+
+    def __init__(
+            self,
+            retry_budget: int,
+            token_budget: Optional[int] = None,
+            max_attempts: int = 4,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+            rng: Optional[random.Random] = None
+    ):
+        self.retry_budget = retry_budget
+        self.token_budget = token_budget
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rng = rng or random.Random()
+
+        self.retries_spent = 0
+        self.tokens_spent = 0
+        self.completions = 0
+        self.time_lost = 0.0
+        self.failures = {TRANSIENT: 0, VALIDATION: 0, FATAL: 0, BUDGET: 0}
+
+        self._request_started = None
+        self._last_completion_seconds = 0.0
+
+    @property
+    def retries_remaining(self) -> int:
+        return max(self.retry_budget - self.retries_spent, 0)
+
+    @property
+    def tokens_remaining(self) -> Optional[int]:
+        if self.token_budget is None:
+            return None
+        return max(self.token_budget - self.tokens_spent, 0)
+
+    def on_completion_kwargs(self, *args, **kwargs):
+        """Hook called before every completion request."""
+        self._request_started = time.time()
+
+    def on_completion_response(self, response):
+        """Hook called after every completion response; counts tokens and times the request."""
+        self.completions += 1
+        if self._request_started is not None:
+            self._last_completion_seconds = time.time() - self._request_started
+            self._request_started = None
+
+        usage = getattr(response, "usage", None)
+        if usage is not None and getattr(usage, "total_tokens", None):
+            self.tokens_spent += usage.total_tokens
+
+    def backoff(self, retry_number: int) -> float:
+        """Delay before retry `retry_number` (starting at 0): exponential with full jitter."""
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry_number))
+
+    def run(self, fn: Callable[[int], Any], max_retries: int = 3) -> Dict[str, Any]:
+        """Run `fn` until it succeeds, fails permanently or the budget runs out.
+
+        Parameters
+        ----------
+        fn : Callable[[int], Any]
+            The call to make. It receives the number of completions it may
+            issue on this attempt: the internal retries it is allowed, capped
+            by the remaining retry budget, plus one for the first completion.
+            Pass it to Instructor through `instructor_max_retries`.
+        max_retries : int, optional
+            Internal retries (e.g. Instructor reasks) to allow per attempt,
+            by default 3
+
+        Returns
+        -------
+        Dict[str, Any]
+            Contains:
+            - result: The value returned by `fn`, or None on failure
+            - error: The last exception raised, or None on success
+            - failure_kind: Classification of `error`, or None on success
+            - attempts: Top-level attempts made
+            - retries: Completions issued beyond the first one
+            - retry_seconds: Time spent on discarded completions and backoff
+            - tokens: Tokens used by all completions for this call
+        """
+        completions_before = self.completions
+        tokens_before = self.tokens_spent
+        time_lost_before = self.time_lost
+        attempts = 0
+        charged = 0
+        result = None
+        error = None
+        failure_kind = None
+
+        while True:
+            if self.tokens_remaining == 0:
+                error = BudgetExhausted(f"Token budget of {self.token_budget} exhausted")
+            elif attempts > 0 and self.retries_remaining == 0:
+                error = BudgetExhausted(f"Retry budget of {self.retry_budget} exhausted")
+            if error is not None:
+                failure_kind = BUDGET
+                break
+
+            attempts += 1
+            attempt_start = time.time()
+            completions_at_attempt = self.completions
+            try:
+                result = fn(min(max_retries, self.retries_remaining) + 1)
+            except Exception as e:
+                error = e
+                failure_kind = classify_failure(e)
+                self.time_lost += time.time() - attempt_start
+            else:
+                # Everything but the completion that produced the result was discarded
+                elapsed = time.time() - attempt_start
+                if self.completions > completions_at_attempt + 1:
+                    self.time_lost += max(elapsed - self._last_completion_seconds, 0.0)
+
+            spent = self._call_retries(completions_before, attempts)
+            self.retries_spent += spent - charged
+            charged = spent
+
+            if error is None:
+                break
+            if failure_kind != TRANSIENT or attempts >= self.max_attempts or self.retries_remaining == 0:
+                break
+
+            delay = self.backoff(attempts - 1)
+            print(f"Transient error ({str(error)}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+            self.time_lost += delay
+            error = None
+            failure_kind = None
+
+        if failure_kind is not None:
+            self.failures[failure_kind] += 1
+
+        return {
+            "result": result,
+            "error": error,
+            "failure_kind": failure_kind,
+            "attempts": attempts,
+            "retries": charged,
+            "retry_seconds": self.time_lost - time_lost_before,
+            "tokens": self.tokens_spent - tokens_before
+        }
+
+    def _call_retries(self, completions_before: int, attempts: int) -> int:
+        """Retries used by a call: every completion or attempt after the first."""
+        return max(self.completions - completions_before, attempts) - 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Budget usage for the whole run."""
+        return {
+            "retry_budget": self.retry_budget,
+            "retries_spent": self.retries_spent,
+            "token_budget": self.token_budget,
+            "tokens_spent": self.tokens_spent,
+            "completions": self.completions,
+            "time_lost_to_retries_seconds": round(self.time_lost, 2),
+            "failures_by_kind": dict(self.failures)
+        }
@@ -0,0 +1,18 @@
+"""
+Small statistics helpers shared by the benchmark, profiling and usage reports.
+
+Kept free of third-party imports, so any module can use them without
+pulling in numpy or the benchmark runner.
+"""
+from typing import Optional, Sequence
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """The q-th percentile (0-100) of `values` with linear interpolation, or None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
@@ -0,0 +1,98 @@
+"""
+A local stand-in for an OpenAI-compatible chat completions endpoint.
+
+Answers every POST to `.../chat/completions` with a fixed JSON message after
+a configurable delay, so the request engines can be benchmarked without
+network access or API spend. Point the demos at it with, for example:
+
+    python stub_server.py --port 8000 --latency 0.5
+    GROQ_BASE_URL=http://127.0.0.1:8000 python pydantic_demo.py
+
+`--fail-first 2 --fail-status 429` answers the first two requests with an
+error status instead, to exercise retry handling.
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.5
+    content = '{"name": "stub", "year": 2024}'
+    # Requests still to be answered with fail_status before answering normally
+    fail_remaining = 0
+    fail_status = 429
+    _fail_lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        time.sleep(self.latency)
+
+        with self._fail_lock:
+            fail = type(self).fail_remaining > 0
+            if fail:
+                type(self).fail_remaining -= 1
+        if fail:
+            self._send_json(self.fail_status, {"error": {"message": f"Stub error {self.fail_status}",
+                                                         "type": "stub_error"}})
+            return
+
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+        completion_tokens = len(self.content.split())
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds to wait before answering")
+    parser.add_argument("--content", default=StubHandler.content, help="Message content to return")
+    parser.add_argument("--fail-first", type=int, default=0, help="Number of requests to answer with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=StubHandler.fail_status,
+                        help="HTTP status for the failed requests")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    StubHandler.content = args.content
+    StubHandler.fail_remaining = args.fail_first
+    StubHandler.fail_status = args.fail_status
+
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    print(f"Serving stub chat completions on http://{args.host}:{args.port} ({args.latency}s latency)")
+    server.serve_forever()
@@ -0,0 +1,24 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_server import StubHandler  # noqa: E402
+
+
+@pytest.fixture
+def stub_server():
+    """A stub chat completions server on a free port. Yields its handler class, to configure per test."""
+    handler = type("Handler", (StubHandler,), {"latency": 0.0, "fail_remaining": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    handler.base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from async_runner import TokenBucket, gather_ordered
+
+
+def test_results_keep_submission_order_and_concurrency_limit():
+    in_flight = []
+    peak = []
+
+    def factory(i):
+        async def request():
+            in_flight.append(i)
+            peak.append(len(in_flight))
+            # Later requests finish first
+            await asyncio.sleep(0.01 * (6 - i))
+            in_flight.remove(i)
+            return i * i
+        return request
+
+    results = asyncio.run(gather_ordered([factory(i) for i in range(6)], max_concurrency=2))
+
+    assert results == [i * i for i in range(6)]
+    assert max(peak) == 2
+
+
+def test_rate_limiter_paces_requests_after_the_burst():
+    starts = []
+
+    async def request():
+        starts.append(time.monotonic())
+
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        await gather_ordered([lambda: request() for _ in range(6)], rate_limiter=bucket)
+
+    asyncio.run(run())
+
+    # Two requests start at once; the other four wait for a token every 1/20 s
+    assert starts[-1] - starts[0] >= 4 / 20 * 0.9
+    assert starts[1] - starts[0] < 0.02
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
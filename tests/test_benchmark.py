@@ -0,0 +1,87 @@
+import pytest
+
+from benchmark import bootstrap_ci, find_regressions, summarize, trim_outliers
+
+
+def row(test_id, latency, tokens=10, valid=True, backend="outlines"):
+    return {"backend": backend, "model": "m", "test_id": test_id, "schema": "Car", "valid": valid,
+            "latency_seconds": latency, "completion_tokens": tokens, "retries": 0}
+
+
+def rows(backend, latencies, tokens=10, valid=True):
+    """Three cases, each repeated once per latency."""
+    return [row(test_id, latency + 0.01 * test_id, tokens, valid, backend)
+            for test_id in range(3) for latency in latencies]
+
+
+def test_trim_outliers_is_per_case():
+    kept = trim_outliers([row(1, latency) for latency in (3, 1, 100, 2)] +
+                         [row(2, latency) for latency in (10, 13, 11, 12)], trim=0.25)
+
+    # The slow case keeps its middle repetitions; only case 1's outliers go
+    assert sorted((r["test_id"], r["latency_seconds"]) for r in kept) == [(1, 2), (1, 3), (2, 11), (2, 12)]
+    assert len(trim_outliers([row(1, 1), row(1, 2)], trim=0)) == 2
+
+
+def test_tokens_per_second_uses_trimmed_rows():
+    summary = summarize([row(1, 1.0), row(1, 1.0), row(1, 1.0), row(1, 100.0)], trim=0.25, bootstrap=0)
+
+    assert summary["outlines"]["tokens_per_second"] == pytest.approx(10.0)
+    assert summary["outlines"]["runs"] == 4
+
+
+def test_bootstrap_ci_is_reproducible_and_brackets_the_estimate():
+    values = [1.0, 1.2, 0.9, 1.1, 1.4, 1.0, 0.8, 1.3, 1.05, 0.95]
+
+    low, high = bootstrap_ci(values, 50, samples=500, seed=3)
+
+    assert low <= 1.025 <= high
+    assert bootstrap_ci(values, 50, samples=500, seed=3) == [low, high]
+    assert bootstrap_ci([1.0], 50) is None
+    assert bootstrap_ci(values, 50, samples=0) is None
+
+
+def stats(latency_ci=None, **overrides):
+    summary = {"latency_p50": 1.0, "latency_p50_ci": latency_ci, "latency_p95": 2.0,
+               "tokens_per_second": 100.0, "validity_rate": 1.0}
+    summary.update(overrides)
+    return summary
+
+
+def test_regressions_in_every_direction():
+    baseline = {"outlines": stats()}
+    current = {"outlines": stats(latency_p50=1.4, latency_ci=[1.2, 1.6], tokens_per_second=80.0,
+                                 validity_rate=0.8)}
+
+    regressions = find_regressions(current, baseline, max_regression=0.1)
+
+    assert [r["metric"] for r in regressions] == ["latency_p50", "tokens_per_second", "validity_rate"]
+    assert regressions[0]["limit"] == pytest.approx(1.1)
+    assert regressions[1]["limit"] == pytest.approx(90.0)
+
+
+def test_improvements_and_noisy_latencies_are_not_regressions():
+    baseline = {"outlines": stats()}
+    # The p50 estimate is above the limit but its interval is not entirely
+    noisy = {"outlines": stats(latency_p50=1.3, latency_ci=[1.0, 1.6])}
+    faster = {"outlines": stats(latency_p50=0.5, latency_p95=1.0, tokens_per_second=200.0)}
+
+    assert find_regressions(noisy, baseline, max_regression=0.1) == []
+    assert find_regressions(faster, baseline, max_regression=0.1) == []
+
+
+def test_backends_missing_from_the_baseline_are_skipped():
+    baseline = {"outlines": stats()}
+    current = {"outlines": stats(), "instructor": stats(latency_p50=50.0, validity_rate=0.0)}
+
+    assert find_regressions(current, baseline) == []
+
+
+def test_regression_from_summarized_rows():
+    baseline = summarize(rows("outlines", [1.0, 1.1, 0.9, 1.0, 1.05]), bootstrap=200)
+    slower = summarize(rows("outlines", [2.0, 2.2, 1.8, 2.0, 2.1]), bootstrap=200)
+    same = summarize(rows("outlines", [1.0, 1.1, 0.9, 1.0, 1.05]), bootstrap=200)
+
+    assert {r["metric"] for r in find_regressions(slower, baseline)} == {"latency_p50", "latency_p95",
+                                                                          "tokens_per_second"}
+    assert find_regressions(same, baseline) == []
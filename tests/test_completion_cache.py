@@ -0,0 +1,63 @@
+import os
+import time
+
+from completion_cache import CompletionCache, completion_key
+
+
+def age(cache, key, seconds):
+    """Backdate an entry's access and modification times."""
+    stamp = time.time() - seconds
+    os.utime(cache._path(key), (stamp, stamp))
+
+
+def test_key_depends_on_every_input():
+    messages = [{"role": "user", "content": "hi"}]
+    key = completion_key("m", messages, schema={"type": "object"}, temperature=0)
+
+    assert key == completion_key("m", [dict(m) for m in messages], schema={"type": "object"}, temperature=0)
+    assert key != completion_key("m", messages, schema={"type": "object"}, temperature=1)
+    assert key != completion_key("other", messages, schema={"type": "object"}, temperature=0)
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = CompletionCache(str(tmp_path), ttl_seconds=60, enabled=True)
+    cache.set("fresh", {"name": "a"})
+    cache.set("stale", {"name": "b"})
+    age(cache, "stale", 120)
+
+    assert cache.get("fresh") == {"name": "a"}
+    assert cache.get("stale") is None
+    assert not os.path.exists(cache._path("stale"))
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_reads_do_not_extend_an_entrys_lifetime(tmp_path):
+    cache = CompletionCache(str(tmp_path), ttl_seconds=60, enabled=True)
+    cache.set("key", 1)
+    age(cache, "key", 50)
+
+    assert cache.get("key") == 1
+    cache.ttl_seconds = 40
+    assert cache.get("key") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = CompletionCache(str(tmp_path), ttl_seconds=None, enabled=True)
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.set(key, "x" * 100)
+        age(cache, key, 300 - 100 * i)
+    cache.max_bytes = 3 * os.path.getsize(cache._path("a"))
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    cache.set("d", "x" * 100)
+
+    assert [key for key in "abcd" if os.path.exists(cache._path(key))] == ["a", "c", "d"]
+
+
+def test_disabled_cache_never_hits(tmp_path):
+    cache = CompletionCache(str(tmp_path / "cache"), enabled=False)
+    cache.set("key", 1)
+
+    assert cache.get("key") is None
+    assert not os.path.exists(cache.cache_dir)
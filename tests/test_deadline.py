@@ -0,0 +1,47 @@
+import time
+
+import torch
+
+from deadline import DeadlineLogitsProcessor
+
+EOS, PAD = 0, 1
+
+
+class Passthrough:
+    calls = 0
+
+    def process_logits(self, input_ids, logits):
+        self.calls += 1
+        return logits
+
+
+def test_applies_processor_before_deadline():
+    inner = Passthrough()
+    processor = DeadlineLogitsProcessor(inner, seconds=60, eos_token_id=EOS, pad_token_id=PAD)
+    processor.start()
+    logits = torch.randn(2, 6)
+
+    assert torch.equal(processor.process_logits(torch.tensor([[3, 4], [5, 6]]), logits.clone()), logits)
+    assert inner.calls == 1
+    assert not processor.expired and processor.forced_sequences == []
+
+
+def test_forces_eos_only_on_unfinished_sequences():
+    processor = DeadlineLogitsProcessor(Passthrough(), seconds=0.01, eos_token_id=EOS, pad_token_id=PAD)
+    processor.start()
+    time.sleep(0.02)
+
+    # The first sequence already ended and is being padded; the second is still generating
+    forced = processor.process_logits(torch.tensor([[3, EOS, PAD], [3, 4, 5]]), torch.randn(2, 6))
+
+    assert processor.expired
+    assert processor.forced_sequences == [False, True]
+    assert forced.argmax(dim=-1).tolist() == [EOS, EOS]
+    assert torch.isinf(forced[:, 1:]).all()
+
+    # Later steps keep forcing EOS without changing which sequences were cut off
+    processor.process_logits(torch.tensor([[3, EOS, PAD, PAD], [3, 4, 5, EOS]]), torch.randn(2, 6))
+    assert processor.forced_sequences == [False, True]
+
+    processor.start()
+    assert not processor.expired and processor.forced_sequences == []
@@ -0,0 +1,17 @@
+import importlib
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize("module", ["pydantic_demo", "instructor_demo", "main"])
+def test_importing_a_demo_writes_nothing(tmp_path, monkeypatch, module):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delitem(sys.modules, module, raising=False)
+
+    demo = importlib.import_module(module)
+
+    assert list(tmp_path.iterdir()) == []
+    # The cache, and its directory, are created on first use
+    assert demo.get_completion_cache() is demo.get_completion_cache()
+    assert (tmp_path / ".completion_cache").is_dir()
@@ -0,0 +1,157 @@
+from copy import copy
+
+import numpy as np
+import pytest
+import torch
+from outlines.fsm.guide import Generate, Guide
+from outlines.processors.structured import GuideLogitsProcessor
+
+from logit_tracking import DecodedTextIndex, LogitTrackingProcessor
+
+VOCAB_SIZE = 12
+
+
+class AllowEven:
+    """Constraint that only allows even token ids."""
+
+    def process_logits(self, input_ids, logits):
+        logits[:, 1::2] = -float("inf")
+        return logits
+
+
+class AlternatingGuide(Guide):
+    """Stateful guide allowing even token ids at even steps and odd ones at odd steps."""
+
+    initial_state = 0
+
+    def get_next_instruction(self, state):
+        return Generate(torch.arange(state % 2, VOCAB_SIZE, 2))
+
+    def get_next_state(self, state, token_id):
+        return state + 1
+
+    def is_final_state(self, state):
+        return False
+
+    def copy(self):
+        return self
+
+
+def generate(tracker, batch_size, steps=3, seed=0, prompt_length=2):
+    """Drive the tracker the way a generation loop does, one step per token."""
+    generator = torch.Generator().manual_seed(seed)
+    input_ids = torch.randint(0, VOCAB_SIZE, (batch_size, prompt_length), generator=generator)
+    for _ in range(steps):
+        logits = tracker.process_logits(input_ids, torch.randn(batch_size, VOCAB_SIZE, generator=generator))
+        input_ids = torch.cat([input_ids, logits.argmax(dim=-1, keepdim=True)], dim=-1)
+    return input_ids
+
+
+@pytest.mark.parametrize("options", [{}, {"top_k": 4}, {"stats_only": True}])
+def test_new_generation_with_another_batch_size(options):
+    tracker = LogitTrackingProcessor(AllowEven(), max_positions=2, **options)
+
+    generate(tracker, batch_size=2, steps=3)
+    assert (tracker.n_sequences, tracker.n_positions) == (2, 3)
+
+    # No clear() in between: the new generation starts a new trace
+    input_ids = generate(tracker, batch_size=3, steps=5)
+    assert (tracker.n_sequences, tracker.n_positions) == (3, 5)
+    assert tracker.for_sequence(2).chosen_tokens == input_ids[2, 1:-1].tolist()
+
+
+class SentencePieceLike:
+    """Decodes a batch of id sequences, dropping the leading space of each sequence."""
+
+    pieces = {0: b" Hello", 1: b" world", 2: b"!", 3: b" caf", 4: b"\xc3", 5: b"\xa9"}
+
+    def __init__(self):
+        self.calls = 0
+
+    def decode(self, batch):
+        self.calls += 1
+        return [b"".join(self.pieces[i] for i in ids).decode("utf-8", errors="replace").removeprefix(" ")
+                for ids in batch]
+
+
+def test_text_index_decodes_each_token_once_with_context():
+    tokenizer = SentencePieceLike()
+    index = DecodedTextIndex(lambda ids: tokenizer.decode([ids])[0], context=2)
+    tokens = [0, 1, 2, 1, 3, 4, 5, 2, 0, 1, 1, 2]
+
+    index.extend(tokens[:5])
+    index.extend(tokens[5:])
+
+    assert index.text == "Hello world! world café! Hello world world!"
+    # The "é" split over two byte tokens is attributed to the second one
+    assert index.prefix(6) == index.prefix(5) == "Hello world! world caf"
+    assert index.prefix(7) == "Hello world! world café"
+    # One decode per token, plus one each time the window moves forward
+    assert tokenizer.calls < 1.5 * len(tokens)
+
+
+def test_sequence_decodes_chosen_tokens_as_one_sequence():
+    tracker = LogitTrackingProcessor(AllowEven())
+    tracker.tokenizer = SentencePieceLike()
+    tracker.tokenizer.pieces = {i: f" t{i}".encode() for i in range(VOCAB_SIZE)}
+
+    generate(tracker, batch_size=1, steps=4)
+
+    chosen = tracker.chosen_tokens
+    assert tracker.sequence() == " ".join(f"t{i}" for i in chosen)
+    assert tracker.sequence(2) == " ".join(f"t{i}" for i in chosen[:2])
+
+
+@pytest.mark.parametrize("options", [{}, {"top_k": 4}])
+def test_save_and_load_round_trip(tmp_path, options):
+    tracker = LogitTrackingProcessor(AllowEven(), **options)
+    tracker.vocab_tokens = [f"t{i}" for i in range(VOCAB_SIZE)]
+    generate(tracker, batch_size=2, steps=4)
+    tracker.save(str(tmp_path))
+
+    loaded = LogitTrackingProcessor.load(str(tmp_path))
+
+    assert (loaded.n_sequences, loaded.n_positions, loaded.vocab_size) == (2, 4, VOCAB_SIZE)
+    assert loaded.get_vocab_mapping() == tracker.vocab_tokens
+    for i in range(2):
+        original, restored = tracker.for_sequence(i), loaded.for_sequence(i)
+        assert restored.chosen_tokens == original.chosen_tokens
+        for name, values in original.get_probabilities(as_matrix=True).items():
+            np.testing.assert_allclose(restored.get_probabilities(as_matrix=True)[name], values)
+        np.testing.assert_array_equal(restored.get_allowed_mask(), original.get_allowed_mask())
+
+
+def test_save_and_load_round_trip_stats_only(tmp_path):
+    tracker = LogitTrackingProcessor(AllowEven(), stats_only=True)
+    generate(tracker, batch_size=2, steps=4)
+    tracker.save(str(tmp_path))
+
+    loaded = LogitTrackingProcessor.load(str(tmp_path), mmap_mode=None)
+
+    assert loaded.stats_only
+    for i in range(2):
+        original, restored = tracker.for_sequence(i).get_step_stats(), loaded.for_sequence(i).get_step_stats()
+        assert original.keys() == restored.keys()
+        for name in original:
+            np.testing.assert_array_equal(restored[name], original[name])
+
+
+def test_repeated_calls_with_a_stateful_guide():
+    tracker = LogitTrackingProcessor(GuideLogitsProcessor(None, AlternatingGuide()))
+
+    # Outlines copies the processor for every call; prompts have different lengths
+    generate(copy(tracker), batch_size=2, steps=3, prompt_length=2)
+    input_ids = generate(copy(tracker), batch_size=2, steps=4, prompt_length=5, seed=1)
+
+    assert tracker.n_positions == 4
+    assert [token % 2 for token in input_ids[0, 5:].tolist()] == [0, 1, 0, 1]
+
+
+@pytest.mark.parametrize("method", ["get_top_tokens", "get_batch_logits"])
+def test_logit_readers_reject_stats_only_mode(method):
+    tracker = LogitTrackingProcessor(AllowEven(), stats_only=True)
+    tracker.vocab_tokens = [f"t{i}" for i in range(VOCAB_SIZE)]
+    generate(tracker, batch_size=2, steps=3)
+
+    with pytest.raises(ValueError, match="dense or top_k"):
+        getattr(tracker, method)()
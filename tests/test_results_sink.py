@@ -0,0 +1,105 @@
+import json
+import os
+
+from results_sink import (JsonlResultsSink, case_key, completed_cases, read_records, rebuild_results_json,
+                          write_json)
+
+
+def record(test_id, success=True, schema="Car"):
+    return {"test_id": test_id, "prompt": f"prompt {test_id}", "schema": schema, "model": "m", "sampler": "greedy",
+            "success": success, "duration_seconds": 1.5}
+
+
+def test_resume_round_trip(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with JsonlResultsSink(path) as sink:
+        sink.append(record(1))
+        sink.append(record(2, success=False))
+    # A crash mid-write leaves a truncated last line
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"test_id": 3, "prompt": "pro')
+
+    completed = completed_cases(path)
+    assert set(completed) == {case_key("prompt 1", "Car", "m", "greedy"), case_key("prompt 2", "Car", "m", "greedy")}
+
+    # Resuming cuts off the truncated line and appends after the existing records
+    with JsonlResultsSink(path, append=True) as sink:
+        sink.append(record(3))
+    assert [r["test_id"] for r in read_records(path)] == [1, 2, 3]
+
+
+def test_resume_keeps_a_complete_record_missing_its_newline(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(record(1)) + "\n" + json.dumps(record(2)))
+
+    with JsonlResultsSink(path, append=True) as sink:
+        sink.append(record(3))
+    assert [r["test_id"] for r in read_records(path)] == [1, 2, 3]
+
+
+def test_rebuild_without_summary(tmp_path):
+    records_path = str(tmp_path / "results.jsonl")
+    output_path = str(tmp_path / "results.json")
+    with JsonlResultsSink(records_path) as sink:
+        for r in (record(2, schema="Person"), record(1), record(3, success=False)):
+            sink.append(r)
+
+    rebuild_results_json(records_path, str(tmp_path / "missing_summary.json"), output_path)
+
+    with open(output_path) as f:
+        rebuilt = json.load(f)
+    assert rebuilt["metadata"]["total_tests"] == 3
+    assert rebuilt["metadata"]["success_count"] == 2
+    assert rebuilt["model_stats"] == {"Person": {"success": 1, "failure": 0, "total": 1},
+                                      "Car": {"success": 1, "failure": 1, "total": 2}}
+    assert [r["test_id"] for r in rebuilt["detailed_results"]] == [1, 2, 3]
+
+
+def test_rebuild_ignores_stale_summary(tmp_path):
+    records_path = str(tmp_path / "results.jsonl")
+    summary_path = str(tmp_path / "summary.json")
+    output_path = str(tmp_path / "results.json")
+    write_json(summary_path, {"metadata": {"total_tests": 99}, "model_stats": {}})
+    with JsonlResultsSink(records_path) as sink:
+        sink.append(record(1))
+    os.utime(summary_path, (0, 0))
+
+    rebuild_results_json(records_path, summary_path, output_path)
+    with open(output_path) as f:
+        assert json.load(f)["metadata"]["total_tests"] == 1
+
+    # A summary written after the records is used as is
+    write_json(summary_path, {"metadata": {"total_tests": 1, "model": "m"}, "model_stats": {}})
+    rebuild_results_json(records_path, summary_path, output_path)
+    with open(output_path) as f:
+        assert json.load(f)["metadata"] == {"total_tests": 1, "model": "m"}
+
+
+def test_write_json_is_atomic(tmp_path):
+    path = str(tmp_path / "out.json")
+    write_json(path, {"a": 1})
+
+    assert os.listdir(tmp_path) == ["out.json"]
+    with open(path) as f:
+        assert json.load(f) == {"a": 1}
+
+
+def test_timed_out_cases_are_rerun_on_resume(tmp_path):
+    records_path = str(tmp_path / "results.jsonl")
+    output_path = str(tmp_path / "results.json")
+    with JsonlResultsSink(records_path) as sink:
+        sink.append(record(1))
+        sink.append({**record(2, success=False), "timed_out": True})
+
+    assert set(completed_cases(records_path)) == {case_key("prompt 1", "Car", "m", "greedy")}
+
+    # The resumed sweep reruns case 2; the rebuilt results keep only its latest record
+    with JsonlResultsSink(records_path, append=True) as sink:
+        sink.append({**record(2), "timed_out": False})
+    rebuild_results_json(records_path, None, output_path)
+
+    with open(output_path) as f:
+        rebuilt = json.load(f)
+    assert [(r["test_id"], r["success"]) for r in rebuilt["detailed_results"]] == [(1, True), (2, True)]
+    assert rebuilt["metadata"]["success_count"] == 2
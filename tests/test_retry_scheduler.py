@@ -0,0 +1,97 @@
+import random
+
+import instructor
+import pytest
+from openai import OpenAI
+from pydantic import BaseModel
+
+from retry_scheduler import FATAL, TRANSIENT, VALIDATION, RetryScheduler, classify_failure, instructor_max_retries
+
+
+class NameYear(BaseModel):
+    name: str
+    year: int
+
+
+class Car(BaseModel):
+    make: str
+    model: str
+
+
+def make_client(stub_server):
+    openai_client = OpenAI(base_url=stub_server.base_url, api_key="x", max_retries=0)
+    return instructor.from_openai(openai_client, mode=instructor.Mode.JSON)
+
+
+def create(client, response_model, allowed=None):
+    def call(attempts):
+        if allowed is not None:
+            allowed.append(attempts)
+        return client.chat.completions.create(
+            model="stub",
+            messages=[{"role": "user", "content": "Name and year"}],
+            response_model=response_model,
+            max_retries=instructor_max_retries(attempts)
+        )
+    return call
+
+
+def raised_by(fn):
+    with pytest.raises(Exception) as info:
+        fn(1)
+    return info.value
+
+
+@pytest.mark.parametrize("status, kind", [(429, TRANSIENT), (503, TRANSIENT), (400, FATAL)])
+def test_classify_api_errors_wrapped_by_instructor(stub_server, status, kind):
+    stub_server.fail_remaining, stub_server.fail_status = 1, status
+
+    assert classify_failure(raised_by(create(make_client(stub_server), NameYear))) == kind
+
+
+def test_classify_schema_mismatch_as_validation(stub_server):
+    assert classify_failure(raised_by(create(make_client(stub_server), Car))) == VALIDATION
+
+
+def test_rate_limit_is_retried(stub_server):
+    stub_server.fail_remaining, stub_server.fail_status = 2, 429
+    scheduler = RetryScheduler(retry_budget=10, base_delay=0.01, rng=random.Random(0))
+
+    outcome = scheduler.run(create(make_client(stub_server), NameYear), max_retries=0)
+
+    assert outcome["error"] is None
+    assert outcome["result"].model_dump() == {"name": "stub", "year": 2024}
+    assert outcome["attempts"] == 3
+    assert outcome["retries"] == 2
+
+
+def test_validation_failure_is_not_retried(stub_server):
+    scheduler = RetryScheduler(retry_budget=10, base_delay=0.01)
+
+    outcome = scheduler.run(create(make_client(stub_server), Car), max_retries=0)
+
+    assert outcome["failure_kind"] == VALIDATION
+    assert outcome["attempts"] == 1
+
+
+def test_reasks_stop_when_the_retry_budget_runs_out(stub_server):
+    scheduler = RetryScheduler(retry_budget=2, base_delay=0.01)
+    client = make_client(stub_server)
+    client.on("completion:kwargs", scheduler.on_completion_kwargs)
+    client.on("completion:response", scheduler.on_completion_response)
+    allowed = []
+
+    # Three reasks are allowed per attempt, but the budget only covers two
+    first = scheduler.run(create(client, Car, allowed), max_retries=3)
+    assert (first["failure_kind"], first["retries"], scheduler.completions) == (VALIDATION, 2, 3)
+
+    # With the budget spent, a call gets its first completion and no reask
+    second = scheduler.run(create(client, Car, allowed), max_retries=3)
+    assert (second["failure_kind"], second["retries"], scheduler.completions) == (VALIDATION, 0, 4)
+    assert allowed == [3, 1]
+
+    # ... and a transient error is not retried
+    stub_server.fail_remaining, stub_server.fail_status = 1, 429
+    third = scheduler.run(create(client, NameYear, allowed), max_retries=3)
+    assert (third["failure_kind"], third["attempts"]) == (TRANSIENT, 1)
+    assert scheduler.retries_spent == 2
@@ -0,0 +1,8 @@
+from stats import percentile
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([3.0], 99) == 3.0
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile([0, 10], 90) == 9.0
@@ -0,0 +1,185 @@
+"""
+Token usage and timing of API completions.
+
+Every logical call (one prompt, with all its retries and Instructor reasks)
+is wrapped in `track_call()`. Within it:
+
+- `record_usage(completion)` adds the `usage` block of each completion as one
+  attempt. Register it as an Instructor "completion:response" hook so every
+  reask is counted, or call it on a plain completion.
+- HTTP clients from `http_client(sdk)` / `async_http_client(sdk)` time each request
+  from sending to the response headers (time to first byte) through httpx
+  event hooks.
+
+The call is found through a context variable, so concurrent asyncio tasks
+each account for their own call.
+
+    with track_call() as call:
+        completion = client.chat.completions.create(...)
+        record_usage(completion)
+    record["usage"] = call.summary(success=True)
+
+Tokens of every attempt but the last one of a successful call, and of every
+attempt of a failed call, are counted as wasted.
+"""
+import importlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from stats import percentile
+
+_current_call: ContextVar[Optional["CallUsage"]] = ContextVar("current_call", default=None)
+
+
+class CallUsage:
+    """Usage and timings collected for one logical call.
+
+    Attributes
+    ----------
+    attempts : List[Dict[str, int]]
+        prompt_tokens, completion_tokens and total_tokens of each completion
+    ttfb_seconds : List[float]
+        Time to first byte of each HTTP request
+    seconds : Optional[float]
+        Wall time of the call, set when `track_call` exits
+    """
+
+    def __init__(self):
+        self.attempts = []
+        self.ttfb_seconds = []
+        self.seconds = None
+        self._started = time.perf_counter()
+        self._request_sent = None
+
+    def add_usage(self, usage):
+        """Add one completion's usage block (an object or dict with the OpenAI fields)."""
+        def get(name):
+            value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+            return value or 0
+
+        self.attempts.append({
+            "prompt_tokens": get("prompt_tokens"),
+            "completion_tokens": get("completion_tokens"),
+            "total_tokens": get("total_tokens") or get("prompt_tokens") + get("completion_tokens")
+        })
+
+    def summary(self, success: bool) -> Dict[str, Any]:
+        """Totals for the call, for storing with its result.
+
+        Parameters
+        ----------
+        success : bool
+            Whether the call produced a valid result. If not, all its tokens are wasted.
+
+        Returns
+        -------
+        Dict[str, Any]
+            attempts, prompt_tokens, completion_tokens, total_tokens,
+            wasted_tokens, ttfb_seconds (of the first request, or None) and
+            seconds. A call answered from a cache has zero attempts.
+        """
+        wasted = self.attempts[:-1] if success else self.attempts
+
+        return {
+            "attempts": len(self.attempts),
+            "prompt_tokens": sum(a["prompt_tokens"] for a in self.attempts),
+            "completion_tokens": sum(a["completion_tokens"] for a in self.attempts),
+            "total_tokens": sum(a["total_tokens"] for a in self.attempts),
+            "wasted_tokens": sum(a["total_tokens"] for a in wasted),
+            "ttfb_seconds": round(self.ttfb_seconds[0], 4) if self.ttfb_seconds else None,
+            "seconds": round(self.seconds, 4) if self.seconds is not None else None
+        }
+
+
+@contextmanager
+def track_call() -> Iterator[CallUsage]:
+    """Collect usage for the completions made inside the block."""
+    call = CallUsage()
+    token = _current_call.set(call)
+    try:
+        yield call
+    finally:
+        _current_call.reset(token)
+        call.seconds = time.perf_counter() - call._started
+
+
+def record_usage(completion):
+    """Add a completion's usage to the current call, if there is one. Usable as an Instructor hook."""
+    call = _current_call.get()
+    usage = getattr(completion, "usage", None)
+    if call is not None and usage is not None:
+        call.add_usage(usage)
+
+
+def _on_request(request):
+    call = _current_call.get()
+    if call is not None:
+        call._request_sent = time.perf_counter()
+
+
+def _on_response(response):
+    call = _current_call.get()
+    if call is not None and call._request_sent is not None:
+        call.ttfb_seconds.append(time.perf_counter() - call._request_sent)
+        call._request_sent = None
+
+
+async def _on_request_async(request):
+    _on_request(request)
+
+
+async def _on_response_async(response):
+    _on_response(response)
+
+
+def http_client(sdk: str = "openai", **kwargs):
+    """An SDK's default httpx client, with time-to-first-byte hooks.
+
+    Parameters
+    ----------
+    sdk : str
+        Module of the SDK the client is for, "openai" or "groq". Each SDK
+        only accepts its own default client (same timeouts and limits).
+    **kwargs
+        Passed to the client
+
+    Returns
+    -------
+    httpx.Client
+        Pass it as `http_client=` to the SDK's client
+    """
+    client_class = importlib.import_module(sdk).DefaultHttpxClient
+    return client_class(event_hooks={"request": [_on_request], "response": [_on_response]}, **kwargs)
+
+
+def async_http_client(sdk: str = "openai", **kwargs):
+    """Async variant of `http_client`, for `AsyncOpenAI` or `AsyncGroq`."""
+    client_class = importlib.import_module(sdk).DefaultAsyncHttpxClient
+    return client_class(event_hooks={"request": [_on_request_async], "response": [_on_response_async]}, **kwargs)
+
+
+def summarize_usage(usages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate the `CallUsage.summary` of several calls, e.g. all calls for one schema.
+
+    Output tokens/sec and time to first byte only count calls that reached
+    the API, not cache hits.
+    """
+    live = [u for u in usages if u["attempts"]]
+    ttfbs = [u["ttfb_seconds"] for u in live if u["ttfb_seconds"] is not None]
+    live_seconds = sum(u["seconds"] or 0 for u in live)
+
+    return {
+        "calls": len(usages),
+        "api_calls": len(live),
+        "attempts": sum(u["attempts"] for u in usages),
+        "prompt_tokens": sum(u["prompt_tokens"] for u in usages),
+        "completion_tokens": sum(u["completion_tokens"] for u in usages),
+        "total_tokens": sum(u["total_tokens"] for u in usages),
+        "wasted_tokens": sum(u["wasted_tokens"] for u in usages),
+        "output_tokens_per_second": (sum(u["completion_tokens"] for u in live) / live_seconds
+                                     if live_seconds else None),
+        "ttfb_p50": percentile(ttfbs, 50),
+        "ttfb_p90": percentile(ttfbs, 90)
+    }
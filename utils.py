@@ -1,494 +1,18 @@
 """
-A simple logit processor that tracks probabilities for both structured and unstructured generation.
+Helpers shared by the demos: prompt templating and plots of tracked token probabilities.
 
-For each token generated, we store:
-- The raw logits the model would assign naturally
-- The filtered logits after applying structural constraints
-- A mapping from vocabulary indices to token strings
+`LogitTrackingProcessor` and `track_logits` live in `logit_tracking.py` and
+are re-exported here on first access, so importing `template` does not load
+torch or outlines. numpy and matplotlib are imported when a plot is drawn.
 """
-from typing import TYPE_CHECKING, Optional, Union, List, Literal, Dict, Any
 
-import numpy as np
-import torch
-from numpy.typing import NDArray
-import matplotlib.pyplot as plt
 
-from outlines.processors.base_logits_processor import OutlinesLogitsProcessor, Array
+def __getattr__(name):
+    if name in ("LogitTrackingProcessor", "track_logits"):
+        import logit_tracking
 
-if TYPE_CHECKING:
-    from outlines.generate import Generator
-
-# Try importing pandas, but don't fail if not available
-try:
-    import pandas as pd
-
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
-    pd = Any  # For type hints when pandas is not available
-
-
-class LogitTrackingProcessor(OutlinesLogitsProcessor):
-    """Tracks logits for both structured and unstructured token generation.
-
-    For each position in the sequence, stores:
-    - unstructured_logits: Raw logits from the model
-    - structured_logits: Logits after applying constraints
-    - vocab_tokens: Mapping from vocab indices to token strings
-
-    Each logit matrix has:
-    - Columns: One for each position in the generated sequence
-    - Rows: One for each token in the vocabulary
-
-    Attributes
-    ----------
-    processor : Optional[OutlinesLogitsProcessor]
-        The processor that applies structural constraints
-    unstructured_logits : List[NDArray]
-        Raw logits from the model for each position
-    structured_logits : List[NDArray]
-        Logits after applying constraints for each position
-    vocab_tokens : Optional[List[str]]
-        Mapping from vocabulary indices to token strings
-    chosen_tokens : List[int]
-        Track actual chosen token IDs during generation
-    """
-
-    def __init__(self, processor=None):
-        """Initialize the tracking processor.
-
-        Parameters
-        ----------
-        processor : Optional[OutlinesLogitsProcessor]
-            The processor that applies structural constraints.
-            If None, only tracks raw logits.
-        """
-        self.processor = processor
-        self.unstructured_logits = []  # List of logit arrays, one per position
-        self.structured_logits = []  # List of logit arrays, one per position
-        self.vocab_tokens = None  # Will store the vocabulary mapping
-        self.chosen_tokens = []  # Track actual chosen tokens during generation
-
-    def process_logits(self, input_ids: Array, logits: Array) -> Array:
-        """Process logits and store them.
-
-        This method:
-        1. Stores the raw logits from the model
-        2. Applies any structural constraints if a processor exists
-        3. Stores the constrained logits
-        4. Tracks the chosen token ID
-
-        Parameters
-        ----------
-        input_ids : Array
-            The input token ids for each sequence in the batch
-        logits : Array
-            The original logits to process, shape (batch_size, vocab_size)
-
-        Returns
-        -------
-        Array
-            The processed logits, shape (batch_size, vocab_size)
-
-        Notes
-        -----
-        - For unconstrained generation (no processor), structured = unstructured
-        - Token IDs are tracked from input_ids to ensure we capture the actual choices
-        """
-        # Always store the raw logits as unstructured
-        self.unstructured_logits.append(logits[0].detach().cpu().numpy().copy())
-
-        # Store the actual chosen token ID if available
-        if len(input_ids[0]) > 0:
-            self.chosen_tokens.append(input_ids[0][-1].item())
-
-        # Apply structural constraints if we have a processor
-        if self.processor is not None:
-            processed = self.processor.process_logits(input_ids, logits)
-            self.structured_logits.append(processed[0].detach().cpu().numpy().copy())
-            return processed
-
-        # For unconstrained generation, structured = unstructured
-        self.structured_logits.append(logits[0].detach().cpu().numpy().copy())
-        return logits
-
-    def get_probabilities(self, as_matrix: bool = False) -> Dict[str, Union[List[NDArray], NDArray]]:
-        """Get probability distributions computed from stored logits.
-
-        Parameters
-        ----------
-        as_matrix : bool
-            If True, convert probability lists to matrices.
-            Each matrix will have shape (vocab_size, n_positions)
-
-        Returns
-        -------
-        Dict[str, Union[List[NDArray], NDArray]]
-            Contains:
-            - unstructured: Raw probability distributions
-            - structured: Probability distributions after constraints
-            Each can be either a list of arrays or a single matrix
-        """
-        # Convert logits to probabilities
-        unstructured_probs = [
-            torch.softmax(torch.tensor(logits), dim=-1).numpy()
-            for logits in self.unstructured_logits
-        ]
-        structured_probs = [
-            torch.softmax(torch.tensor(logits), dim=-1).numpy()
-            for logits in self.structured_logits
-        ]
-
-        if as_matrix:
-            # Stack arrays into matrices
-            unstructured = np.column_stack(unstructured_probs)
-            structured = np.column_stack(structured_probs)
-        else:
-            # Return as lists
-            unstructured = unstructured_probs
-            structured = structured_probs
-
-        return {
-            'unstructured': unstructured,
-            'structured': structured
-        }
-
-    def get_logits(self, as_matrix: bool = False) -> Dict[str, Union[List[NDArray], NDArray]]:
-        """Get the stored logit values.
-
-        Parameters
-        ----------
-        as_matrix : bool
-            If True, convert logit lists to matrices.
-            Each matrix will have shape (vocab_size, n_positions)
-
-        Returns
-        -------
-        Dict[str, Union[List[NDArray], NDArray]]
-            Contains:
-            - unstructured: Raw logit values
-            - structured: Logit values after constraints
-            Each can be either a list of arrays or a single matrix
-        """
-        if as_matrix:
-            unstructured = np.column_stack(self.unstructured_logits)
-            structured = np.column_stack(self.structured_logits)
-        else:
-            unstructured = self.unstructured_logits
-            structured = self.structured_logits
-
-        return {
-            'unstructured': unstructured,
-            'structured': structured
-        }
-
-    def get_top_tokens(
-            self,
-            k: int = 10,
-            positions: Optional[Union[int, List[int]]] = None,
-            include_logits: bool = True
-    ) -> List[Dict[str, Any]]:
-        """Get the top k tokens at specified positions with their probabilities and logits.
-
-        Parameters
-        ----------
-        k : int, optional
-            Number of top tokens to return, by default 10
-        positions : Union[int, List[int]], optional
-            Position(s) to analyze. Can be a single position or list of positions.
-            By default analyzes all positions.
-        include_logits : bool, optional
-            Whether to include raw logit values in addition to probabilities
-
-        Returns
-        -------
-        List[Dict[str, Any]]
-            List of dictionaries, one per position, containing:
-            - position: Position in sequence
-            - text_so_far: Text generated up to this position
-            - tokens: List of top k token dictionaries, each containing:
-                - token: The token string
-                - natural_prob: Unconstrained probability
-                - constrained_prob: Probability after constraints
-                - natural_logit: Raw logit value (if include_logits=True)
-                - constrained_logit: Constrained logit value (if include_logits=True)
-                - is_chosen: Whether this token was actually chosen
-        """
-        # Convert single position to list
-        if positions is None:
-            positions = list(range(len(self.structured_logits)))
-        elif isinstance(positions, int):
-            positions = [positions]
-
-        # Get probabilities and logits
-        probs = self.get_probabilities()
-        logits = self.get_logits() if include_logits else None
-
-        # Get vocab mapping
-        vocab = self.get_vocab_mapping()
-
-        results = []
-        for pos in positions:
-            if pos >= len(self.unstructured_logits):
-                continue
-
-            # Get text generated so far
-            text_so_far = self.sequence(pos)
-
-            # Get values for this position
-            u_probs = probs['unstructured'][pos]
-            s_probs = probs['structured'][pos]
-
-            if include_logits:
-                u_logits = logits['unstructured'][pos]
-                s_logits = logits['structured'][pos]
-
-            # Get top k indices by maximum probability
-            top_indices = np.argsort(np.maximum(u_probs, s_probs))[-k:][::-1]
-
-            # Get the actual next token for comparison
-            next_token = self.sequence(pos + 1)[len(text_so_far):] if pos < len(self.structured_logits) - 1 else ""
-
-            # Build token info list
-            tokens = []
-            for idx in top_indices:
-                token = vocab[idx]
-                token_info = {
-                    'token': token,
-                    'natural_prob': float(u_probs[idx]),
-                    'constrained_prob': float(s_probs[idx]),
-                    'is_chosen': token == next_token
-                }
-
-                if include_logits:
-                    token_info.update({
-                        'natural_logit': float(u_logits[idx]),
-                        'constrained_logit': float(s_logits[idx])
-                    })
-
-                tokens.append(token_info)
-
-            results.append({
-                'position': pos,
-                'text_so_far': text_so_far,
-                'tokens': tokens
-            })
-
-        return results
-
-    def get_vocab_mapping(self) -> List[str]:
-        """Get the mapping from vocabulary indices to token strings.
-
-        Returns
-        -------
-        List[str]
-            List of token strings, where index matches vocabulary index
-
-        Raises
-        ------
-        AttributeError
-            If no tokenizer is available
-        """
-        if not hasattr(self, 'tokenizer'):
-            raise AttributeError("No tokenizer available for mapping tokens")
-
-        if self.vocab_tokens is None:
-            # Create the mapping if we haven't yet
-            self.vocab_tokens = [
-                self.processor.tokenizer.decode([i])[0]
-                for i in range(len(self.unstructured_logits[0]))
-            ]
-
-        return self.vocab_tokens
-
-    def clear(self):
-        """Clear all stored logits."""
-        self.unstructured_logits = []
-        self.structured_logits = []
-        self.chosen_tokens = []
-
-    def to_dataframe(
-            self,
-            show: Literal["probs", "logits"] = "probs",
-            top_k: Optional[int] = None,
-            min_value: Optional[float] = None
-    ) -> "pd.DataFrame":
-        """Convert tracking data to a pandas DataFrame for analysis.
-
-        Parameters
-        ----------
-        show : Literal["probs", "logits"], optional
-            Whether to show probabilities or logit values, by default "probs"
-        top_k : Optional[int], optional
-            If provided, only include the top k tokens at each position
-            (based on maximum of structured/unstructured values)
-        min_value : Optional[float], optional
-            If provided, only include tokens with values >= min_value
-            in either structured or unstructured distribution
-
-        Returns
-        -------
-        pd.DataFrame
-            DataFrame with columns:
-            - position: Token position in sequence
-            - token: String representation of token
-            - natural: Raw model values (probs/logits)
-            - constrained: Values after constraints
-
-        Examples
-        --------
-        >>> # Get probability data for top 10 tokens
-        >>> df = processor.to_dataframe(show="probs", top_k=10)
-        >>> df.sort_values("natural", ascending=False).head()
-        >>>
-        >>> # Get logit data above threshold
-        >>> df = processor.to_dataframe(show="logits", min_value=-5)
-        >>> df.query("position == 0").nlargest(5, "natural")
-        >>>
-        >>> # Get all tokens with probability > 1%
-        >>> df = processor.to_dataframe(show="probs", min_value=0.01)
-
-        Raises
-        ------
-        ImportError
-            If pandas is not installed
-        """
-        if not PANDAS_AVAILABLE:
-            raise ImportError(
-                "pandas is required for DataFrame support. "
-                "Please install it with: pip install pandas"
-            )
-
-        # Get values based on show parameter
-        if show == "probs":
-            values = self.get_probabilities()
-        else:
-            values = self.get_logits()
-
-        # Get vocab mapping
-        vocab = self.get_vocab_mapping()
-
-        # Create lists to store data
-        rows = []
-
-        # Process each position
-        for pos in range(len(self.unstructured_logits)):
-            u_vals = values['unstructured'][pos]
-            s_vals = values['structured'][pos]
-
-            # Get indices to include based on filters
-            if top_k is not None or min_value is not None:
-                # Get maximum value between structured/unstructured for sorting
-                max_vals = np.maximum(u_vals, s_vals)
-
-                if top_k is not None and min_value is not None:
-                    # Both filters: get top k among values >= min_value
-                    valid_indices = np.where(max_vals >= min_value)[0]
-                    if len(valid_indices) > top_k:
-                        valid_indices = valid_indices[np.argsort(max_vals[valid_indices])[-top_k:]]
-                elif top_k is not None:
-                    # Just top k: get indices of k largest values
-                    valid_indices = np.argsort(max_vals)[-top_k:]
-                else:  # min_value is not None
-                    # Just threshold: get indices of all values >= min_value
-                    valid_indices = np.where(max_vals >= min_value)[0]
-            else:
-                # No filters: include all tokens
-                valid_indices = range(len(vocab))
-
-            # Add rows for valid indices
-            for idx in valid_indices:
-                rows.append({
-                    'position': pos,
-                    'token': vocab[idx],
-                    'natural': u_vals[idx],
-                    'constrained': s_vals[idx]
-                })
-
-        return pd.DataFrame(rows)
-
-    def sequence(self, pos: Optional[int] = None) -> str:
-        """Get the sequence of tokens generated up to a position.
-
-        Parameters
-        ----------
-        pos : Optional[int], optional
-            Position to reconstruct up to (exclusive).
-            If None, returns the entire sequence.
-
-        Returns
-        -------
-        str
-            The concatenated string of chosen tokens
-
-        Raises
-        ------
-        AttributeError
-            If no tokenizer is available for decoding
-        """
-        if not self.chosen_tokens:
-            return ""
-
-        if not hasattr(self, 'tokenizer'):
-            raise AttributeError("No tokenizer available for decoding sequence")
-
-        # Get the tokenizer
-        if hasattr(self.processor, 'tokenizer'):
-            tokenizer = self.processor.tokenizer
-        else:
-            tokenizer = self.tokenizer
-
-        # Get tokens up to the specified position
-        end_pos = len(self.chosen_tokens) if pos is None else pos
-        tokens_to_decode = self.chosen_tokens[:end_pos]
-
-        # Decode the sequence
-        return "".join(tokenizer.decode(tokens_to_decode))
-
-
-def track_logits(generator: "Generator") -> "Generator":
-    """Add probability tracking to any generator.
-
-    This is a convenience function that wraps a generator's logits processor
-    with a LogitTrackingProcessor, enabling analysis of token probabilities
-    during generation.
-
-    Parameters
-    ----------
-    generator : Generator
-        The generator to add tracking to
-
-    Returns
-    -------
-    Generator
-        The same generator with tracking enabled
-
-    Examples
-    --------
-    >>> # Track probabilities for unconstrained text generation
-    >>> generator = generate.text(model)
-    >>> generator = track_logits(generator)
-    >>>
-    >>> # Track probabilities for JSON generation
-    >>> generator = generate.json(model, schema)
-    >>> generator = track_logits(generator)
-    """
-    # If there's no logits_processor, throw an error. Logit tracking
-    # is currently only supported for structured generators.
-    if generator.logits_processor is None:
-        raise ValueError("Logit tracking is not supported for this generator")
-
-    # Create tracking processor, wrapping any existing processor
-    tracking = LogitTrackingProcessor(generator.logits_processor)
-
-    # Add tokenizer for token mapping
-    if hasattr(generator.logits_processor, 'tokenizer'):
-        tracking.tokenizer = generator.logits_processor.tokenizer
-
-    # Set as the generator's processor
-    generator.logits_processor = tracking
-
-    return generator
+        return getattr(logit_tracking, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # This function applies a simple chat template to the prompt
@@ -526,6 +50,11 @@ def plot_token_distributions(tracking_processor, k=10, positions=None, prefix=""
     - Only probabilities > 1% show their exact values
     - Grid lines help compare probabilities between tokens
     """
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    from logit_tracking import top_k_indices
+
     # Get probability matrices and vocab mapping
     probs = tracking_processor.get_probabilities(as_matrix=True)
     vocab = tracking_processor.get_vocab_mapping()
@@ -535,6 +64,11 @@ def plot_token_distributions(tracking_processor, k=10, positions=None, prefix=""
         positions = list(range(probs['unstructured'].shape[1]))
     n_positions = len(positions)
 
+    # Top k tokens by maximum probability at every plotted position, smallest first
+    top_indices_by_pos = top_k_indices(
+        np.maximum(probs['unstructured'][:, positions], probs['structured'][:, positions]).T, k
+    )[:, ::-1]
+
     # Create plot
     fig, axes = plt.subplots(1, n_positions)
     if n_positions == 1:
@@ -545,8 +79,7 @@ def plot_token_distributions(tracking_processor, k=10, positions=None, prefix=""
         unstructured = probs['unstructured'][:, pos]
         structured = probs['structured'][:, pos]
 
-        # Get top k tokens by maximum probability
-        top_indices = np.argsort(np.maximum(unstructured, structured))[-k:]
+        top_indices = top_indices_by_pos[idx]
 
         # Create bar positions
         y = np.arange(len(top_indices))
@@ -615,6 +148,11 @@ def plot_heatmap(tracking_processor, k=50, positions=None, prefix="", show_both=
     - Near-zero probabilities are masked out (shown in gray)
     - For constrained generation, blocked tokens appear masked
     """
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    from logit_tracking import top_k_indices
+
     # Get probability matrices and vocab mapping
     if kind == "logits":
         things = tracking_processor.get_logits(as_matrix=True)
@@ -636,7 +174,7 @@ def plot_heatmap(tracking_processor, k=50, positions=None, prefix="", show_both=
         things['unstructured'].max(axis=1),
         things['structured'].max(axis=1)
     )
-    top_indices = np.argsort(max_probs)[-k:]
+    top_indices = top_k_indices(max_probs, k)[::-1]
 
     # Create masked arrays for better visualization
     def mask_array(arr):